@@ -0,0 +1,168 @@
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Set
+from telethon import TelegramClient
+from config import TelegramConfig, load_account_configs
+from tg_client_manager import TelegramClientManager, get_client_manager
+from rate_limiter import TokenBucket, get_rate_limiter
+from peer_cache import PeerCache, get_peer_cache
+from conversation_store import PENDING
+
+logger = logging.getLogger(__name__)
+
+
+class Account:
+    """One Telegram account: its client manager, send budget and peer cache.
+
+    Args:
+        name: Account key stored on conversations (the session name)
+        manager: Client manager for the account's session
+        config: The account's credentials (None lets the manager load the default ones)
+    """
+
+    def __init__(self, name: str, manager: TelegramClientManager, config: Optional[TelegramConfig] = None):
+        self.name = name
+        self.manager = manager
+        self.config = config
+        self.rate_limiter: TokenBucket = get_rate_limiter(name)
+        self.peer_cache: PeerCache = get_peer_cache(name)
+        self.conversations: Set[str] = set()
+        self.failed = False
+
+    def ready(self) -> bool:
+        """Whether new work can go to this account (started and not in FloodWait/PeerFlood)."""
+        return not self.failed and not self.rate_limiter.is_blocked()
+
+    def send_delay(self) -> float:
+        """
+        Estimated seconds before this account could send for one more conversation.
+
+        Counts the remaining penalty, then assumes every conversation already
+        assigned needs a send before the new one gets a token.
+        """
+        bucket = self.rate_limiter
+        penalty = max(0.0, bucket.blocked_until - time.monotonic())
+        backlog = len(self.conversations) + 1 - bucket.available()
+        return penalty + max(0.0, backlog) / bucket.rate
+
+
+class AccountPool:
+    """Shards conversations across Telegram accounts.
+
+    A conversation is assigned to an account once and stays there, since the
+    target's replies arrive on that account. New conversations go to the
+    ready account that could send soonest given its remaining token budget
+    and the conversations it already carries; accounts in FloodWait or
+    PeerFlood (a penalized bucket) or that failed to start get no new work.
+    """
+
+    def __init__(self, accounts: List[Account]):
+        if not accounts:
+            raise ValueError("AccountPool needs at least one account")
+        self.accounts: Dict[str, Account] = {account.name: account for account in accounts}
+
+    @classmethod
+    def from_configs(cls, configs: List[TelegramConfig], client_factory=TelegramClient) -> "AccountPool":
+        return cls([
+            Account(config.get_session_name(), TelegramClientManager(config, client_factory), config)
+            for config in configs
+        ])
+
+    def get(self, name: Optional[str]) -> Optional[Account]:
+        return self.accounts.get(name) if name else None
+
+    def choose(self) -> Account:
+        """The account new work should go to."""
+        candidates = [account for account in self.accounts.values() if account.ready()]
+        if not candidates:
+            # Everything is paused; queue behind the account that frees up first
+            candidates = [account for account in self.accounts.values() if not account.failed] or list(self.accounts.values())
+        return min(candidates, key=lambda account: (account.send_delay(), len(account.conversations)))
+
+    def assign(self, conversation: dict, store=None) -> Account:
+        """
+        Return the account a conversation runs on, assigning one if needed.
+
+        A conversation keeps its account once its intro may have gone out.
+        One still waiting for its intro is moved if its account can't take
+        work right now.
+
+        Args:
+            conversation: Conversation record; its "account" field is updated
+            store: Conversation store to persist a new assignment to
+        """
+        account = self.get(conversation.get("account"))
+        movable = conversation.get("state") in (None, PENDING)
+        if account is None or (movable and not account.ready() and len(self.accounts) > 1):
+            if conversation.get("account") and account is None:
+                logger.warning(f"Account {conversation['account']} is no longer configured, reassigning conversation {conversation['id']}")
+            previous = account
+            account = self.choose()
+            if previous is not None:
+                previous.conversations.discard(conversation["id"])
+            conversation["account"] = account.name
+            if store is not None:
+                store.update(conversation["id"], account=account.name)
+        account.conversations.add(conversation["id"])
+        return account
+
+    def release(self, conversation: dict):
+        """Stop counting a finished conversation against its account."""
+        account = self.get(conversation.get("account"))
+        if account is not None:
+            account.conversations.discard(conversation["id"])
+
+    async def start(self):
+        """Start every account; ones that fail are skipped until restarted."""
+        for account in self.accounts.values():
+            try:
+                await account.manager.start()
+                account.failed = False
+            except Exception as e:
+                account.failed = True
+                logger.error(f"Telegram account {account.name} not started: {e}")
+
+    async def stop(self):
+        for account in self.accounts.values():
+            await account.manager.stop()
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "ready": account.ready(),
+                "conversations": len(account.conversations),
+                "sendBudget": account.rate_limiter.available(),
+            }
+            for name, account in self.accounts.items()
+        }
+
+
+_pool: Optional[AccountPool] = None
+
+
+def get_account_pool() -> AccountPool:
+    """Return the process-wide pool: the TELEGRAM_ACCOUNTS accounts, or the single default account."""
+    global _pool
+    if _pool is None:
+        configs = load_account_configs()
+        if configs:
+            _pool = AccountPool.from_configs(configs)
+        else:
+            # The default account keeps using the shared client manager
+            _pool = AccountPool([Account(os.getenv("SESSION_NAME", "telegram_session"), get_client_manager())])
+    return _pool
+
+
+def shard_account_pool(index: int, count: int) -> AccountPool:
+    """
+    Restrict this process's pool to its share of the accounts.
+
+    A Telethon session can't be used by two processes at once, so outreach
+    worker processes split the accounts: process `index` of `count` keeps
+    every `count`-th account starting at `index`.
+    """
+    global _pool
+    accounts = list(get_account_pool().accounts.values())
+    _pool = AccountPool(accounts[index::count])
+    return _pool
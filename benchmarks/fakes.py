@@ -0,0 +1,257 @@
+"""In-process stand-ins for Supabase, Telegram and Gemini used by the benchmarks.
+
+They mimic only the parts of each client the app calls, answer from memory,
+and expose knobs for the latencies and failures worth measuring under.
+"""
+import re
+import json
+import asyncio
+import random
+import itertools
+from typing import Dict, List, Optional
+from telethon import errors
+from telethon.tl.types import User
+
+
+# --- Supabase ---
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Query builder over a list of dict rows (select/filter/order/limit/insert/upsert)."""
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+        self._columns = "*"
+        self._filters = []
+        self._order = None
+        self._limit = None
+        self._write = None
+
+    def select(self, columns: str = "*"):
+        self._columns = columns
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self._filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self._filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def order(self, column, desc: bool = False):
+        self._order = (column, desc)
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def insert(self, rows):
+        self._write = ("insert", rows if isinstance(rows, list) else [rows])
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self._write = ("upsert", rows if isinstance(rows, list) else [rows])
+        return self
+
+    def execute(self) -> FakeResponse:
+        if self._write:
+            kind, rows = self._write
+            by_id = {row.get("id"): row for row in self.rows} if kind == "upsert" else {}
+            for row in rows:
+                if row.get("id") in by_id:
+                    by_id[row["id"]].update(row)
+                else:
+                    self.rows.append(dict(row))
+            return FakeResponse(rows)
+        rows = [row for row in self.rows if all(f(row) for f in self._filters)]
+        if self._order:
+            column, desc = self._order
+            rows.sort(key=lambda row: row.get(column), reverse=desc)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._columns.strip() != "*":
+            columns = [c.strip() for c in self._columns.split(",")]
+            rows = [{c: row.get(c) for c in columns} for row in rows]
+        return FakeResponse(rows)
+
+
+class FakeSupabase:
+    """Supabase client holding its tables in memory."""
+
+    def __init__(self, tables: Optional[Dict[str, List[dict]]] = None):
+        self.tables = tables or {}
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self.tables.setdefault(name, []))
+
+
+def make_leads(count: int, domain: str = "fintech") -> List[dict]:
+    """PotentialLeads rows that all match a summary mentioning `domain`."""
+    roles = ["founder", "cto", "product manager", "head of growth", "engineer"]
+    return [
+        {
+            "id": i,
+            "username": f"lead{i}",
+            "tg_id": f"lead{i}",
+            "domain": domain,
+            "role": roles[i % len(roles)],
+            "person_description": f"{roles[i % len(roles)]} at a {domain} startup",
+            "avatar": "L",
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+# --- Telegram ---
+
+class FakeMessage:
+    """Incoming private message, shaped like a NewMessage event."""
+
+    def __init__(self, sender: User, text: str, message_id: int):
+        self.sender = sender
+        self.sender_id = sender.id
+        self.text = text
+        self.id = message_id
+        self.is_private = True
+        self.out = False
+
+    async def get_sender(self):
+        return self.sender
+
+
+class FakeTelegramClient:
+    """TelegramClient stand-in that answers every first message with a reply.
+
+    Args:
+        flood_rate: Probability that a send raises FloodWaitError
+        flood_seconds: Wait carried by those errors
+        reply_delay: Seconds before the target replies
+        question_rate: Share of replies that ask a question (answered by the
+            LLM) instead of agreeing outright (answered by the local classifier)
+        rpc_latency: Seconds each get_entity/send_message call takes
+    """
+
+    def __init__(self, session=None, api_id=None, api_hash=None, flood_rate: float = 0.0, flood_seconds: int = 1,
+                 reply_delay: float = 0.05, question_rate: float = 0.5, rpc_latency: float = 0.0):
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.reply_delay = reply_delay
+        self.question_rate = question_rate
+        self.rpc_latency = rpc_latency
+        self.handlers = []
+        self.connected = False
+        self.users: Dict[str, User] = {}
+        self.sent: Dict[int, int] = {}
+        self.flood_waits = 0
+        self._ids = itertools.count(1000)
+        self._message_ids = itertools.count(1)
+
+    async def start(self, phone=None):
+        self.connected = True
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    def is_connected(self):
+        return self.connected
+
+    async def get_me(self):
+        return User(id=1, first_name="Bench", username="bench")
+
+    def add_event_handler(self, callback, event=None):
+        self.handlers.append(callback)
+
+    async def get_entity(self, username: str) -> User:
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+        username = username.lstrip("@")
+        if username not in self.users:
+            self.users[username] = User(id=next(self._ids), access_hash=random.getrandbits(62), username=username)
+        return self.users[username]
+
+    async def send_message(self, peer, text):
+        if self.rpc_latency:
+            await asyncio.sleep(self.rpc_latency)
+        if self.flood_rate and random.random() < self.flood_rate:
+            self.flood_waits += 1
+            raise errors.FloodWaitError(request=None, capture=self.flood_seconds)
+        user_id = getattr(peer, "user_id", None) or peer.id
+        self.sent[user_id] = self.sent.get(user_id, 0) + 1
+        if self.sent[user_id] == 1:
+            asyncio.get_running_loop().call_later(self.reply_delay, lambda: asyncio.ensure_future(self._reply(user_id)))
+
+    async def _reply(self, user_id: int):
+        sender = next(user for user in self.users.values() if user.id == user_id)
+        text = "How much does it cost?" if random.random() < self.question_rate else "Sounds good!"
+        message = FakeMessage(sender, text, next(self._message_ids))
+        for handler in self.handlers:
+            await handler(message)
+
+    async def iter_messages(self, peer, limit=20):
+        return
+        yield
+
+
+def telegram_client_factory(**options):
+    """Factory for TelegramClientManager that builds FakeTelegramClients with the given options."""
+    def factory(session, api_id, api_hash):
+        return FakeTelegramClient(session, api_id, api_hash, **options)
+    return factory
+
+
+# --- Gemini ---
+
+class FakeGeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeGenerativeModel:
+    """genai.GenerativeModel stand-in that answers each prompt shape the app sends."""
+
+    def __init__(self, genai: "FakeGenAI", model_name: str, system_instruction=None):
+        self.genai = genai
+        self.model_name = model_name
+
+    async def generate_content_async(self, prompt, generation_config=None):
+        self.genai.calls += 1
+        if self.genai.latency:
+            await asyncio.sleep(self.genai.latency * random.uniform(0.5, 1.5))
+        if "JSON array" in prompt:
+            count = len(re.findall(r"^\d+\. ", prompt, re.MULTILINE))
+            text = json.dumps([{"target": i, "message": f"Hi! Intro number {i}."} for i in range(1, count + 1)])
+        elif "JSON object" in prompt:
+            text = json.dumps({"message": "Happy to share details on a quick call with the founder.", "status": "AGREED"})
+        elif "'AGREED', 'DISAGREED', or 'CONTINUE'" in prompt:
+            text = "AGREED"
+        else:
+            text = "Target audience: fintech founders. Problem: slow onboarding. Channels: Telegram."
+        return FakeGeminiResponse(text)
+
+
+class FakeGenAI:
+    """Stand-in for the google.generativeai module; pass it to GeminiProvider(genai=...)."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def configure(self, api_key=None):
+        pass
+
+    def GenerativeModel(self, model_name, system_instruction=None):
+        return FakeGenerativeModel(self, model_name, system_instruction)
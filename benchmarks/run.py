@@ -0,0 +1,283 @@
+"""End-to-end benchmark of the outreach pipeline against in-process fakes.
+
+Drives /api/campaign-context and /api/launch-campaign through the ASGI app,
+follows every launched conversation to its final state, and measures
+TelegramSender.send_message on its own. Supabase, Telegram and Gemini are
+replaced by the stand-ins in benchmarks/fakes.py, so no accounts or network
+are needed (httpx is required to call the app). Cold start is measured first
+by importing main.py in fresh interpreters: import time, peak RSS and which
+heavy SDKs got loaded (none are expected until a route needs them).
+
+Usage:
+    python benchmarks/run.py --leads 500 --concurrency 50 --flood-rate 0.01
+
+Results are printed and appended as one JSON line to bench_output.txt.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the launch -> match -> intro -> send -> reply loop")
+    parser.add_argument("--leads", type=int, default=200, help="Matched leads per launched campaign")
+    parser.add_argument("--accounts", type=int, default=1, help="Telegram accounts in the pool")
+    parser.add_argument("--concurrency", type=int, default=50, help="Conversations driven at once per account")
+    parser.add_argument("--context-requests", type=int, default=200, help="Calls to /api/campaign-context")
+    parser.add_argument("--context-concurrency", type=int, default=20, help="Concurrent /api/campaign-context calls")
+    parser.add_argument("--sends", type=int, default=500, help="Direct TelegramSender.send_message calls")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Mean fake Gemini latency in seconds")
+    parser.add_argument("--reply-delay", type=float, default=0.05, help="Seconds before a fake target replies")
+    parser.add_argument("--question-rate", type=float, default=0.5, help="Share of replies that need the LLM")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="Probability a send raises FloodWaitError")
+    parser.add_argument("--flood-seconds", type=int, default=1, help="Seconds carried by each FloodWaitError")
+    parser.add_argument("--sends-per-minute", type=int, default=60000, help="Token bucket rate (TG_SENDS_PER_MINUTE)")
+    parser.add_argument("--startup-runs", type=int, default=5, help="Fresh interpreters timed importing main.py")
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report Python heap peaks (slower)")
+    parser.add_argument("--output", default=os.path.join(ROOT, "bench_output.txt"), help="File to append results to")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's own logging and prints")
+    return parser.parse_args()
+
+
+def configure_environment(args, workdir: str):
+    """Settings the app reads at import time, so this must run before importing it."""
+    os.environ.update({
+        "API_ID": "1", "API_HASH": "bench", "PHONE_NUMBER": "+10000000000", "SESSION_NAME": "bench",
+        "SUPABASE_URL": "http://localhost:54321", "SUPABASE_KEY": "bench",
+        "GEMINI_API_KEY": "bench", "LLM_PROVIDERS": "gemini", "LLM_HEDGE": "0",
+        "CONVERSATION_STORE": "sqlite", "CONVERSATION_DB": os.path.join(workdir, "conversations.db"),
+        "PEER_CACHE_DB": os.path.join(workdir, "peer_cache.db"),
+        "TG_SENDS_PER_MINUTE": str(args.sends_per_minute), "TG_SEND_BURST": str(max(1, args.concurrency)),
+        "CAMPAIGN_MAX_CONCURRENCY": str(args.concurrency),
+        "CAMPAIGN_EVENTS_QUEUE_SIZE": str(max(1000, args.leads * 8)),
+        "REPLY_TIMEOUT_SECONDS": "60",
+    })
+    if args.accounts > 1:
+        names = [f"BENCH{i}" for i in range(1, args.accounts + 1)]
+        os.environ["TELEGRAM_ACCOUNTS"] = ",".join(names)
+        for name in names:
+            os.environ.update({f"{name}_API_ID": "1", f"{name}_API_HASH": "bench",
+                               f"{name}_PHONE_NUMBER": "+10000000000", f"{name}_SESSION_NAME": name.lower()})
+
+
+def percentile(samples, p: float) -> float:
+    """Nearest-rank percentile of a list of samples."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))]
+
+
+def latency_summary(samples) -> dict:
+    return {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2) if samples else 0.0,
+    }
+
+
+def memory_snapshot() -> dict:
+    # ru_maxrss is in kilobytes on Linux
+    snapshot = {"max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)}
+    if tracemalloc.is_tracing():
+        snapshot["heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.reset_peak()
+    return snapshot
+
+
+# Modules that should stay unloaded until a route or the lifespan needs them
+HEAVY_MODULES = ("telethon", "supabase", "numpy", "requests", "openai", "google.generativeai")
+
+STARTUP_PROBE = f"""
+import json, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {ROOT!r})
+import main
+print(json.dumps({{
+    "import_seconds": time.perf_counter() - start,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [m for m in {HEAVY_MODULES!r} if m in sys.modules],
+}}))
+"""
+
+
+def bench_startup(runs: int) -> dict:
+    """Import main.py in fresh interpreters, as a cold-started instance would."""
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-c", STARTUP_PROBE], capture_output=True, text=True, check=True)
+        samples.append(json.loads(output.stdout.strip().splitlines()[-1]))
+    return {
+        "import": latency_summary([sample["import_seconds"] for sample in samples]),
+        "max_rss_mb": round(max(sample["max_rss_mb"] for sample in samples), 1),
+        "heavy_modules": samples[-1]["heavy_modules"] if samples else [],
+    }
+
+
+async def bench_campaign_context(http, requests: int, concurrency: int) -> dict:
+    """Distinct payloads, so every call goes past the response cache to the LLM."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        payload = {"initialMessage": f"We help fintech teams onboard faster (variant {i})",
+                   "qaPairs": [{"question": "Who is the audience?", "answer": "Fintech founders"}]}
+        async with semaphore:
+            start = time.perf_counter()
+            response = await http.post("/api/campaign-context", json=payload)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {"latency": latency_summary(latencies), "requests_per_second": round(requests / elapsed, 1),
+            "memory": memory_snapshot()}
+
+
+async def bench_launch(http, bus, leads: int) -> dict:
+    """Launch one campaign and follow every conversation to a final state."""
+    final_states = {"agreed", "disagreed", "timed_out", "failed"}
+    queue = bus.subscribe()
+    try:
+        start = time.perf_counter()
+        response = await http.post("/api/launch-campaign", json={"summary": "A fintech onboarding tool"})
+        launch_latency = time.perf_counter() - start
+        response.raise_for_status()
+        body = response.json()
+        expected = len(body["campaigns"])
+        sent_at, durations, outcomes = {}, [], {}
+        while len(durations) < expected:
+            event = await asyncio.wait_for(queue.get(), timeout=60)
+            if event["campaignId"] != body["campaignId"]:
+                continue
+            if event["status"] == "sent":
+                sent_at[event["conversationId"]] = time.perf_counter()
+            elif event["status"] in final_states:
+                outcomes[event["status"]] = outcomes.get(event["status"], 0) + 1
+                # Time from the intro going out to the conversation closing
+                durations.append(time.perf_counter() - sent_at.get(event["conversationId"], start))
+        elapsed = time.perf_counter() - start
+    finally:
+        bus.unsubscribe(queue)
+    return {
+        "leads": expected,
+        "launch_latency_ms": round(launch_latency * 1000, 2),
+        "conversation_latency": latency_summary(durations),
+        "conversations_per_second": round(expected / elapsed, 1) if elapsed else 0.0,
+        "outcomes": outcomes,
+        "memory": memory_snapshot(),
+    }
+
+
+async def bench_sender(pool, sends: int, concurrency: int) -> dict:
+    """TelegramSender.send_message alone: peer resolution, token bucket and FloodWait handling."""
+    from telethon import errors
+    from tg_agent import shared_sender
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, failures = [], 0
+
+    def flood_waits():
+        return sum(account.manager.client.flood_waits for account in pool.accounts.values() if account.manager.client)
+
+    flood_before = flood_waits()
+    names = list(pool.accounts)
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            # Sends are spread over the accounts in turn
+            sender = await shared_sender(names[i % len(names)])
+            start = time.perf_counter()
+            try:
+                ok = await sender.send_message(f"sendbench{i}", "Hello from the benchmark")
+            except errors.FloodWaitError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            failures += not ok
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(sends)))
+    elapsed = time.perf_counter() - start
+    return {"latency": latency_summary(latencies), "sends_per_second": round(sends / elapsed, 1),
+            "failures": failures, "flood_waits": flood_waits() - flood_before, "memory": memory_snapshot()}
+
+
+async def run(args) -> dict:
+    import httpx
+    from benchmarks.fakes import FakeGenAI, FakeSupabase, make_leads, telegram_client_factory
+
+    # Swap the real clients for the fakes before the app first asks for them
+    import supabase_client
+    supabase_client._client = FakeSupabase({"PotentialLeads": make_leads(args.leads)})
+    import llm_gateway
+    genai = FakeGenAI(latency=args.llm_latency)
+    llm_gateway._gateway = llm_gateway.LLMGateway()
+    llm_gateway._gateway.register(lambda: llm_gateway.GeminiProvider(genai=genai), name="gemini")
+    import account_pool
+    from config import TelegramConfig, load_account_configs
+    pool = account_pool._pool = account_pool.AccountPool.from_configs(
+        load_account_configs() or [TelegramConfig()],
+        client_factory=telegram_client_factory(
+            flood_rate=args.flood_rate, flood_seconds=args.flood_seconds,
+            reply_delay=args.reply_delay, question_rate=args.question_rate,
+        ),
+    )
+
+    import main
+    from campaign_events import get_event_bus
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    results = {"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "params": vars(args), "baseline": memory_snapshot()}
+    if args.startup_runs:
+        results["startup"] = bench_startup(args.startup_runs)
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            results["campaign_context"] = await bench_campaign_context(http, args.context_requests, args.context_concurrency)
+            results["launch_campaign"] = await bench_launch(http, get_event_bus(), args.leads)
+        results["telegram_sender"] = await bench_sender(pool, args.sends, args.concurrency * args.accounts)
+    results["llm_calls"] = genai.calls
+    return results
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="liaser-bench-")
+    configure_environment(args, workdir)
+    sys.path.insert(0, ROOT)
+    # The app writes its log file and local databases to the working directory
+    os.chdir(workdir)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    if args.verbose:
+        results = asyncio.run(run(args))
+    else:
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                results = asyncio.run(run(args))
+            finally:
+                sys.stdout = stdout
+
+    print(json.dumps(results, indent=2))
+    with open(args.output, "a") as f:
+        f.write(json.dumps(results) + "\n")
+    print(f"Results appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
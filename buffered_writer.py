@@ -0,0 +1,152 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Failed flushes (one per retry window) after which a batch is written one
+# write at a time and the writes that still fail are dropped
+BUFFERED_WRITE_MAX_ATTEMPTS = int(os.getenv("BUFFERED_WRITE_MAX_ATTEMPTS", "5"))
+# A failed batch is dropped rather than kept for retry once this many writes are pending
+BUFFERED_WRITE_MAX_PENDING = int(os.getenv("BUFFERED_WRITE_MAX_PENDING", "100000"))
+
+
+class BufferedWriter:
+    """Collects writes in memory and stores them a batch at a time.
+
+    A flush is triggered once `flush_size` writes are pending, and by the
+    background flusher every `flush_interval` seconds. Batches are written in
+    a worker thread so storage never blocks the event loop. A batch that
+    fails to write is put back ahead of newer writes and retried with
+    backoff, so a storage outage delays writes instead of losing them. After
+    `max_attempts` failures the batch is written one write at a time and the
+    writes that still fail (e.g. a row storage rejects) are logged and
+    dropped, so one bad write can't block the rest forever; if none of them
+    can be written, storage is down and the batch is kept. No more than
+    `max_pending` writes are kept for retry. Subclasses keep the buffer and
+    implement `pending_writes`, `_take`, `_restore`, `_split` and
+    `_write_batch`.
+    """
+
+    def __init__(self, flush_size: int, flush_interval: float, max_attempts: int = BUFFERED_WRITE_MAX_ATTEMPTS,
+                 max_pending: int = BUFFERED_WRITE_MAX_PENDING):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.max_pending = max_pending
+        self._flush_lock = asyncio.Lock()
+        self._flush_scheduled = False
+        self._flusher: Optional[asyncio.Task] = None
+        # After a failed write, size-triggered flushes wait for the flusher's retry
+        self._retry_at = 0.0
+        self._failures = 0
+
+    def pending_writes(self) -> int:
+        """Number of buffered writes not yet flushed."""
+        raise NotImplementedError
+
+    def _take(self):
+        """Empty the buffer and return its contents as one batch."""
+        raise NotImplementedError
+
+    def _restore(self, batch):
+        """Put a batch that failed to write back in front of the buffer."""
+        raise NotImplementedError
+
+    def _split(self, batch) -> list:
+        """One batch per write in `batch`, oldest first."""
+        raise NotImplementedError
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def _store(self, batch):
+        try:
+            self._write_batch(batch)
+        except Exception:
+            if self._failures + 1 < self.max_attempts:
+                raise
+            self._store_apart(batch)
+        self._failures = 0
+        self._retry_at = 0.0
+
+    def _store_apart(self, batch):
+        parts = self._split(batch)
+        failed = []
+        for part in parts:
+            try:
+                self._write_batch(part)
+            except Exception as e:
+                failed.append((part, e))
+        if len(parts) > 1 and len(failed) == len(parts):
+            # Nothing could be written, so storage is down rather than the writes bad
+            raise failed[-1][1]
+        for part, error in failed:
+            logger.error(f"{type(self).__name__} dropped a write that failed {self.max_attempts} times: {error} ({part!r:.300})")
+
+    def _failed(self, batch):
+        now = time.monotonic()
+        if now >= self._retry_at:
+            # Flushes during the backoff (e.g. before reads) don't use up attempts
+            self._failures += 1
+            self._retry_at = now + self.flush_interval * 2 ** (self._failures - 1)
+        writes = len(self._split(batch))
+        if self.pending_writes() + writes > self.max_pending:
+            logger.error(f"{type(self).__name__} has {self.pending_writes()} writes pending, dropping {writes} that failed to store")
+            return
+        self._restore(batch)
+
+    def _maybe_flush(self):
+        if self.pending_writes() < self.flush_size or self._flush_scheduled or time.monotonic() < self._retry_at:
+            return
+        try:
+            asyncio.get_running_loop().create_task(self._scheduled_flush())
+            self._flush_scheduled = True
+        except RuntimeError:
+            # No loop running (e.g. a script); write synchronously
+            batch = self._take()
+            try:
+                self._store(batch)
+            except Exception:
+                self._failed(batch)
+                raise
+
+    async def flush(self):
+        """Write everything buffered so far without blocking the event loop."""
+        # Batches are taken and written under one lock so they land in order
+        async with self._flush_lock:
+            self._flush_scheduled = False
+            if not self.pending_writes():
+                return
+            batch = self._take()
+            try:
+                await asyncio.to_thread(self._store, batch)
+            except Exception:
+                self._failed(batch)
+                raise
+
+    async def _scheduled_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"{type(self).__name__} flush failed, will retry: {e}")
+
+    async def _run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._scheduled_flush()
+
+    def start(self):
+        """Start the background flusher on the running loop."""
+        if self._flusher is None:
+            self._flusher = asyncio.get_event_loop().create_task(self._run_flusher())
+
+    async def stop(self):
+        """Stop the background flusher and write what's left."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            await asyncio.gather(self._flusher, return_exceptions=True)
+            self._flusher = None
+        await self.flush()
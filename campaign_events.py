@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before the oldest are dropped, and how many
+# campaigns keep their latest per-conversation status for late subscribers
+CAMPAIGN_EVENTS_QUEUE_SIZE = int(os.getenv("CAMPAIGN_EVENTS_QUEUE_SIZE", "1000"))
+CAMPAIGN_EVENTS_RETAINED = int(os.getenv("CAMPAIGN_EVENTS_RETAINED", "100"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+
+# Status values published for a conversation
+SENT = "sent"
+REPLIED = "replied"
+
+
+class CampaignEventBus:
+    """In-process pub/sub for conversation status transitions.
+
+    Each subscriber gets its own bounded queue, so a slow client only loses
+    its own oldest events. The latest status of every conversation is kept
+    per campaign so a client that subscribes late still starts from the
+    current picture.
+    """
+
+    def __init__(self, queue_size: int = CAMPAIGN_EVENTS_QUEUE_SIZE, retained: int = CAMPAIGN_EVENTS_RETAINED):
+        self.queue_size = queue_size
+        self.retained = retained
+        self._subscribers: Dict[asyncio.Queue, Optional[str]] = {}
+        self._latest: "OrderedDict[str, Dict[str, dict]]" = OrderedDict()
+
+    def publish(self, campaign_id: Optional[str], conversation_id: str, lead_id, username: str, status: str):
+        """Publish a status transition for one conversation."""
+        event = {
+            "campaignId": campaign_id,
+            "conversationId": conversation_id,
+            "leadId": None if lead_id is None else str(lead_id),
+            "username": username,
+            "status": status,
+            "at": time.time(),
+        }
+        if campaign_id:
+            latest = self._latest.setdefault(campaign_id, {})
+            latest[conversation_id] = event
+            self._latest.move_to_end(campaign_id)
+            while len(self._latest) > self.retained:
+                self._latest.popitem(last=False)
+        for queue, wanted in list(self._subscribers.items()):
+            if wanted is not None and wanted != campaign_id:
+                continue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    def snapshot(self, campaign_id: str) -> list:
+        """Latest event for every conversation of a campaign."""
+        return list(self._latest.get(campaign_id, {}).values())
+
+    def subscribe(self, campaign_id: Optional[str] = None) -> asyncio.Queue:
+        """
+        Start receiving events for one campaign, or for all when campaign_id is None.
+
+        The returned queue already holds the campaign's latest statuses.
+        Call unsubscribe with it when done.
+        """
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        if campaign_id:
+            for event in self.snapshot(campaign_id)[-self.queue_size:]:
+                queue.put_nowait(event)
+        self._subscribers[queue] = campaign_id
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.pop(queue, None)
+
+
+async def sse_stream(bus: CampaignEventBus, campaign_id: Optional[str] = None) -> AsyncIterator[str]:
+    """Format a subscription as Server-Sent Events, with periodic keep-alive comments."""
+    queue = bus.subscribe(campaign_id)
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield f"event: status\ndata: {json.dumps(event)}\n\n"
+    finally:
+        bus.unsubscribe(queue)
+
+
+async def sse_events(events: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """Format any async stream of status events as Server-Sent Events, with keep-alives."""
+    iterator = events.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait({pending}, timeout=SSE_KEEPALIVE_SECONDS)
+            if not done:
+                yield ": keep-alive\n\n"
+                continue
+            event, pending = pending.result(), None
+            yield f"event: status\ndata: {json.dumps(event)}\n\n"
+    except StopAsyncIteration:
+        return
+    finally:
+        if pending is not None:
+            pending.cancel()
+        await iterator.aclose()
+
+
+_bus: Optional[CampaignEventBus] = None
+
+
+def get_event_bus() -> CampaignEventBus:
+    """Return the process-wide CampaignEventBus."""
+    global _bus
+    if _bus is None:
+        _bus = CampaignEventBus()
+    return _bus
@@ -0,0 +1,344 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Set
+from conversation_store import ACTIVE_STATES, PENDING, get_conversation_store
+from job_queue import JOB_LEASE_SECONDS, QUEUED, JobQueue, get_job_queue
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of conversations resolving, writing or sending at the same time
+# per Telegram account; conversations waiting for a reply don't count
+CAMPAIGN_MAX_CONCURRENCY = int(os.getenv("CAMPAIGN_MAX_CONCURRENCY", "50"))
+# Number of targets whose intros are written by a single LLM call
+INTRO_BATCH_SIZE = int(os.getenv("INTRO_BATCH_SIZE", "20"))
+# "inline" drives conversations inside the API process; "queue" hands them to
+# outreach_worker.py processes through the job queue
+OUTREACH_MODE = os.getenv("OUTREACH_MODE", "inline")
+# Job kind carrying one intro batch of conversation ids
+CONVERSATIONS_JOB = "conversations"
+# Minimum delay before a conversation left unfinished (e.g. by a long
+# FloodWait) is started again, and how many times that is tried
+CAMPAIGN_RETRY_SECONDS = float(os.getenv("CAMPAIGN_RETRY_SECONDS", "30"))
+CAMPAIGN_MAX_RETRIES = int(os.getenv("CAMPAIGN_MAX_RETRIES", "5"))
+
+
+class ConversationSlot:
+    """One conversation's share of a scheduler's concurrency limit.
+
+    The slot is held while the conversation does work (resolving the target,
+    generating and sending messages) and handed back while it is parked
+    waiting for a reply, which can take up to REPLY_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self._semaphore = semaphore
+        self.held = False
+
+    async def acquire(self):
+        await self._semaphore.acquire()
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def parked(self):
+        """Give the slot up for the duration of the block and take it back afterwards."""
+        self.release()
+        try:
+            yield
+        finally:
+            await self.acquire()
+
+
+def _create_conversations(store, campaign_id: str, product_summary: str, leads: List[dict]) -> List[dict]:
+    """A PENDING conversation record for every lead that has a Telegram id."""
+    return [
+        store.create(
+            campaign_id=campaign_id,
+            lead_id=lead.get("id"),
+            username=lead.get("tg_id", ""),
+            product_summary=product_summary,
+            target_description=lead.get("person_description", ""),
+        )
+        for lead in leads
+        if lead.get("tg_id", "")
+    ]
+
+
+class CampaignScheduler:
+    """Fans a campaign out to all matched leads with bounded concurrency.
+
+    Every lead gets a durable conversation record up front. Intros are
+    generated in batches, then the conversations are queued and started as
+    slots free up. A conversation holds its slot (see ConversationSlot) only
+    while it works and parks without one while waiting for a reply, so the
+    concurrency limit bounds sends and LLM calls rather than open
+    conversations. Each conversation is assigned to one of the pool's
+    Telegram accounts, and the send rate is governed by that account's token
+    bucket inside TelegramSender, so FloodWait penalties slow that account
+    down instead of dropping leads. A conversation that comes back still
+    active (a FloodWait too long to sit out) is requeued once its account's
+    bucket is unblocked. After a restart, `resume` requeues every
+    conversation that hadn't finished.
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None, batch_size: int = INTRO_BATCH_SIZE,
+                 store=None, accounts: Optional["AccountPool"] = None):
+        # Imported here so queue mode never loads the Telegram stack
+        from account_pool import get_account_pool
+        self.batch_size = batch_size
+        self.store = store if store is not None else get_conversation_store()
+        self.accounts = accounts if accounts is not None else get_account_pool()
+        # Slots scale with the accounts so every account's budget can be used
+        self.max_concurrency = max_concurrency or CAMPAIGN_MAX_CONCURRENCY * len(self.accounts.accounts)
+        self.queue: Optional[asyncio.Queue] = None
+        self.slots: Optional[asyncio.Semaphore] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._batches = set()
+        self._retries: Dict[str, int] = {}
+        self._retry_handles: Dict[str, asyncio.TimerHandle] = {}
+
+    def _ensure_started(self):
+        if self._dispatcher is not None:
+            return
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        self._dispatcher = asyncio.get_event_loop().create_task(self._dispatch())
+
+    async def _dispatch(self):
+        # A queued conversation starts once a slot is free and keeps running,
+        # parked, while it waits for replies
+        while True:
+            conversation = await self.queue.get()
+            slot = ConversationSlot(self.slots)
+            await slot.acquire()
+            task = asyncio.get_event_loop().create_task(self._drive(conversation, slot))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _drive(self, conversation: dict, slot: ConversationSlot):
+        import tg_agent
+        state = None
+        try:
+            state = await tg_agent.run_conversation(conversation, slot)
+        except Exception as e:
+            logger.error(f"Campaign {conversation['campaign_id']}: conversation with {conversation['username']} failed: {e}")
+        finally:
+            slot.release()
+            self.queue.task_done()
+        if state is None or state in ACTIVE_STATES:
+            self._retry(conversation)
+        else:
+            self._retries.pop(conversation["id"], None)
+
+    def _retry(self, conversation: dict):
+        """Start an unfinished conversation again once its account may send."""
+        conversation_id = conversation["id"]
+        attempts = self._retries.get(conversation_id, 0) + 1
+        if attempts > CAMPAIGN_MAX_RETRIES:
+            # Left active in the store for the next `resume`
+            self._retries.pop(conversation_id, None)
+            logger.error(f"Campaign {conversation['campaign_id']}: giving up on {conversation['username']} after {CAMPAIGN_MAX_RETRIES} retries")
+            return
+        self._retries[conversation_id] = attempts
+        account = self.accounts.get(conversation.get("account"))
+        penalty = account.rate_limiter.blocked_until - time.monotonic() if account is not None else 0.0
+        delay = max(CAMPAIGN_RETRY_SECONDS, penalty)
+        logger.info(f"Campaign {conversation['campaign_id']}: retrying {conversation['username']} in {delay:.0f}s")
+
+        def requeue():
+            self._retry_handles.pop(conversation_id, None)
+            self.queue.put_nowait(conversation)
+
+        self._retry_handles[conversation_id] = asyncio.get_event_loop().call_later(delay, requeue)
+
+    def submit(self, product_summary: str, leads: List[dict], campaign_id: Optional[str] = None) -> str:
+        """
+        Queue a conversation for every lead that has a Telegram id.
+
+        Args:
+            product_summary: The campaign summary used to write the intros
+            leads: Matched PotentialLeads rows
+            campaign_id: Add the leads to an existing campaign (e.g. when
+                they are submitted in chunks while streaming)
+
+        Returns:
+            The campaign id (generated if not given)
+        """
+        self._ensure_started()
+        campaign_id = campaign_id or uuid.uuid4().hex
+        conversations = _create_conversations(self.store, campaign_id, product_summary, leads)
+        # Intros are written a chunk at a time; each chunk's conversations are
+        # queued as soon as its batch call returns
+        for start in range(0, len(conversations), self.batch_size):
+            self._prepare(conversations[start:start + self.batch_size])
+        logger.info(f"Campaign {campaign_id}: scheduling {len(conversations)} conversations")
+        return campaign_id
+
+    async def resume(self) -> int:
+        """Requeue every conversation left unfinished by a previous run."""
+        self._ensure_started()
+        conversations = await self.store.active()
+        # Conversations that never got an intro still share batch calls, per product
+        fresh = {}
+        for conversation in conversations:
+            if conversation["state"] == PENDING and not conversation.get("intro"):
+                fresh.setdefault(conversation["product_summary"], []).append(conversation)
+            else:
+                self.queue.put_nowait(conversation)
+        for group in fresh.values():
+            for start in range(0, len(group), self.batch_size):
+                self._prepare(group[start:start + self.batch_size])
+        if conversations:
+            logger.info(f"Resumed {len(conversations)} unfinished conversations")
+        return len(conversations)
+
+    def _prepare(self, conversations: List[dict]):
+        task = asyncio.get_event_loop().create_task(self._prepare_batch(conversations))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _prepare_batch(self, conversations: List[dict]):
+        await self.prepare_batch(conversations)
+        for conversation in conversations:
+            self.queue.put_nowait(conversation)
+
+    async def prepare_batch(self, conversations: List[dict]):
+        """Assign accounts, warm their peer caches and write the intros of one batch."""
+        import tg_agent
+        # Spread the batch over the Telegram accounts; each conversation stays on its account
+        by_account = {}
+        for conversation in conversations:
+            account = self.accounts.assign(conversation, self.store)
+            by_account.setdefault(account.name, []).append(conversation["username"])
+        for account, usernames in by_account.items():
+            try:
+                # Resolve usernames before the first send so conversations start from
+                # the peer cache of the account that will message them
+                await tg_agent.warm_peer_cache(usernames, account)
+            except Exception as e:
+                logger.error(f"Warming peer cache for {account} failed: {e}")
+        try:
+            intros = await tg_agent.generate_intros_batch(
+                conversations[0]["product_summary"], [c["target_description"] for c in conversations]
+            )
+            for conversation, intro in zip(conversations, intros):
+                conversation["intro"] = intro
+                self.store.update(conversation["id"], intro=intro)
+        except Exception as e:
+            # Conversations will generate their own intros
+            logger.error(f"Batched intro generation failed: {e}")
+
+    def pending(self) -> int:
+        """Number of conversations waiting to start."""
+        return self.queue.qsize() if self.queue else 0
+
+    async def refresh_pending(self):
+        """Nothing to do: the in-process queue size is always current."""
+
+    async def stop(self):
+        """Cancel the dispatcher and all conversations (in-flight conversations are abandoned)."""
+        tasks = ([self._dispatcher] if self._dispatcher is not None else []) + list(self._running) + list(self._batches)
+        for task in tasks:
+            task.cancel()
+        for handle in self._retry_handles.values():
+            handle.cancel()
+        self._retry_handles.clear()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+
+
+class QueuedCampaignScheduler:
+    """Hands campaigns to out-of-process outreach workers through the job queue.
+
+    Conversation records are created here as with CampaignScheduler, and one
+    job per intro batch is enqueued once the records are flushed, so a worker
+    always finds them in the store. Workers run the jobs (see
+    outreach_worker.py) and conversations of a worker that dies are picked up
+    again when their job's lease runs out, so this process never touches
+    Telegram. `resume` only enqueues conversations left without a job, e.g.
+    when the API stopped between creating them and enqueueing.
+    """
+
+    def __init__(self, batch_size: int = INTRO_BATCH_SIZE, store=None, queue: Optional[JobQueue] = None):
+        self.batch_size = batch_size
+        self.store = store if store is not None else get_conversation_store()
+        self.queue = queue if queue is not None else get_job_queue()
+        self._enqueues = set()
+        # Queued job count as of the last refresh_pending; reading it from
+        # the job queue is blocking I/O
+        self._queued = 0
+
+    def submit(self, product_summary: str, leads: List[dict], campaign_id: Optional[str] = None) -> str:
+        """Same contract as CampaignScheduler.submit; the jobs are enqueued in the background."""
+        campaign_id = campaign_id or uuid.uuid4().hex
+        conversations = _create_conversations(self.store, campaign_id, product_summary, leads)
+        batches = [
+            [conversation["id"] for conversation in conversations[start:start + self.batch_size]]
+            for start in range(0, len(conversations), self.batch_size)
+        ]
+        task = asyncio.get_event_loop().create_task(self._enqueue(campaign_id, batches))
+        self._enqueues.add(task)
+        task.add_done_callback(self._enqueues.discard)
+        logger.info(f"Campaign {campaign_id}: queueing {len(conversations)} conversations in {len(batches)} jobs")
+        return campaign_id
+
+    async def _enqueue(self, campaign_id: str, batches: List[List[str]]):
+        # Workers read the conversations from the store, so they must be written first
+        await self.store.flush()
+        for conversation_ids in batches:
+            await asyncio.to_thread(
+                self.queue.enqueue, CONVERSATIONS_JOB, {"campaign_id": campaign_id, "conversation_ids": conversation_ids}
+            )
+        await self.refresh_pending()
+
+    async def resume(self) -> int:
+        """Enqueue unfinished conversations that no queued or leased job covers."""
+        conversations = await self.store.active()
+        payloads = await asyncio.to_thread(self.queue.active_payloads, CONVERSATIONS_JOB)
+        covered = {conversation_id for payload in payloads for conversation_id in payload.get("conversation_ids", [])}
+        # Newer ones may still be on their way into the queue from another API process
+        cutoff = time.time() - JOB_LEASE_SECONDS
+        orphans = {}
+        for conversation in conversations:
+            if conversation["id"] not in covered and (conversation.get("created_at") or 0) < cutoff:
+                orphans.setdefault(conversation["campaign_id"], []).append(conversation["id"])
+        for campaign_id, conversation_ids in orphans.items():
+            batches = [conversation_ids[start:start + self.batch_size] for start in range(0, len(conversation_ids), self.batch_size)]
+            await self._enqueue(campaign_id, batches)
+        count = sum(len(ids) for ids in orphans.values())
+        if count:
+            logger.info(f"Enqueued {count} unfinished conversations that had no job")
+        return count
+
+    def pending(self) -> int:
+        """Number of jobs waiting for an outreach worker, as of the last refresh_pending."""
+        return self._queued
+
+    async def refresh_pending(self):
+        """Re-read the queued job count from the job queue, off the event loop."""
+        stats = await asyncio.to_thread(self.queue.stats)
+        self._queued = stats[QUEUED]
+
+    async def stop(self):
+        """Finish enqueueing what was submitted so no conversation is left without a job."""
+        await asyncio.gather(*self._enqueues, return_exceptions=True)
+
+
+_scheduler = None
+
+
+def get_campaign_scheduler():
+    """Return the process-wide scheduler for OUTREACH_MODE."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = QueuedCampaignScheduler() if OUTREACH_MODE == "queue" else CampaignScheduler()
+    return _scheduler
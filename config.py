@@ -1,17 +1,24 @@
 import os
+from typing import List
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
 class TelegramConfig:
-    """Configuration class for Telegram API credentials and settings."""
+    """Configuration class for Telegram API credentials and settings.
     
-    def __init__(self):
-        self.api_id = os.getenv('API_ID')
-        self.api_hash = os.getenv('API_HASH')
-        self.phone_number = os.getenv('PHONE_NUMBER')
-        self.session_name = os.getenv('SESSION_NAME', 'telegram_session')
+    Args:
+        prefix: Environment variable prefix of the account (e.g. "ACC1_" reads
+            ACC1_API_ID, ACC1_API_HASH, ...). Empty for the single default account.
+    """
+    
+    def __init__(self, prefix: str = ''):
+        self.prefix = prefix
+        self.api_id = os.getenv(f'{prefix}API_ID')
+        self.api_hash = os.getenv(f'{prefix}API_HASH')
+        self.phone_number = os.getenv(f'{prefix}PHONE_NUMBER')
+        self.session_name = os.getenv(f'{prefix}SESSION_NAME', f'{prefix.lower()}telegram_session')
         
         # Validate required credentials
         self._validate_credentials()
@@ -21,11 +28,11 @@ class TelegramConfig:
         missing_credentials = []
         
         if not self.api_id:
-            missing_credentials.append('API_ID')
+            missing_credentials.append(f'{self.prefix}API_ID')
         if not self.api_hash:
-            missing_credentials.append('API_HASH')
+            missing_credentials.append(f'{self.prefix}API_HASH')
         if not self.phone_number:
-            missing_credentials.append('PHONE_NUMBER')
+            missing_credentials.append(f'{self.prefix}PHONE_NUMBER')
         
         if missing_credentials:
             raise ValueError(
@@ -51,3 +58,14 @@ class TelegramConfig:
     def get_session_name(self):
         """Get session name."""
         return self.session_name
+
+
+def account_names() -> List[str]:
+    """Account names listed in TELEGRAM_ACCOUNTS (e.g. "ACC1,ACC2"); empty for the single default account."""
+    return [name.strip().upper() for name in os.getenv('TELEGRAM_ACCOUNTS', '').split(',') if name.strip()]
+
+
+def load_account_configs() -> List[TelegramConfig]:
+    """One config per account in TELEGRAM_ACCOUNTS, read from <NAME>_API_ID, <NAME>_API_HASH,
+    <NAME>_PHONE_NUMBER and <NAME>_SESSION_NAME."""
+    return [TelegramConfig(prefix=f'{name}_') for name in account_names()]
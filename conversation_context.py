@@ -0,0 +1,88 @@
+import os
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the history section of each prompt, and the number of
+# recent turns kept verbatim before older ones are folded into the summary
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "1500"))
+CONVERSATION_WINDOW_TURNS = int(os.getenv("CONVERSATION_WINDOW_TURNS", "8"))
+
+Summarizer = Callable[[str, List[dict]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)."""
+    return max(1, len(text) // 4) if text else 0
+
+
+def format_turn(turn: dict) -> str:
+    return f"{turn['role']}: {turn['text']}"
+
+
+class ConversationContext:
+    """Bounded prompt context: recent turns verbatim plus a rolling summary.
+
+    Turns are appended to a window. Once the window holds more than
+    `window_turns` turns or exceeds the token budget, the oldest turns are
+    folded into the summary with a single summarizer call, leaving half a
+    window so the next summarization is several turns away. Prompt size stays
+    flat however long the conversation runs.
+    """
+
+    def __init__(self, token_budget: int = CONVERSATION_TOKEN_BUDGET, window_turns: int = CONVERSATION_WINDOW_TURNS,
+                 summarizer: Optional[Summarizer] = None, summary: str = "", turns: Optional[List[dict]] = None):
+        self.token_budget = token_budget
+        self.window_turns = window_turns
+        self.summarizer = summarizer
+        self.summary = summary
+        self.window: Deque[dict] = deque(turns or [])
+
+    def _window_tokens(self) -> int:
+        return sum(estimate_tokens(format_turn(turn)) for turn in self.window)
+
+    def _overflowing(self) -> bool:
+        if len(self.window) <= 1:
+            return False
+        return (len(self.window) > self.window_turns
+                or estimate_tokens(self.summary) + self._window_tokens() > self.token_budget)
+
+    async def add(self, role: str, name: str, text: str):
+        """Append a turn and compact the window if it overflowed."""
+        self.window.append({"role": role, "name": name, "text": text})
+        if self._overflowing():
+            await self.compact()
+
+    async def compact(self):
+        """Fold the oldest turns into the summary until the window is half full."""
+        overflow = []
+        keep = max(1, self.window_turns // 2)
+        while self._overflowing() or len(self.window) > keep:
+            overflow.append(self.window.popleft())
+        if not overflow:
+            return
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = await self.summarizer(self.summary, overflow)
+            except Exception as e:
+                logger.warning(f"Conversation summarization failed: {e}")
+        if not summary:
+            # Without a summary, keep the tail of the old turns as plain text
+            summary = "\n".join(filter(None, [self.summary] + [format_turn(turn) for turn in overflow]))
+        # The summary gets at most a third of the budget
+        max_chars = self.token_budget * 4 // 3
+        self.summary = summary[-max_chars:]
+
+    def render(self) -> str:
+        """History text for a prompt: the summary followed by the recent turns."""
+        lines = []
+        if self.summary:
+            lines.append(f"Summary of earlier conversation: {self.summary}")
+        lines.extend(format_turn(turn) for turn in self.window)
+        return "\n".join(lines)
+
+    def __len__(self):
+        return len(self.window)
@@ -0,0 +1,265 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+from buffered_writer import BufferedWriter
+
+logger = logging.getLogger(__name__)
+
+# "sqlite" for local runs, "supabase" in production
+CONVERSATION_STORE = os.getenv("CONVERSATION_STORE", "sqlite")
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "conversations.db")
+# Buffered writes are flushed when this many are pending, or every interval
+CONVERSATION_FLUSH_SIZE = int(os.getenv("CONVERSATION_FLUSH_SIZE", "100"))
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "1.0"))
+
+# Conversation states
+PENDING = "pending"                # intro not sent yet
+AWAITING_REPLY = "awaiting_reply"  # last message was ours, waiting for the target
+AGREED = "agreed"
+DISAGREED = "disagreed"
+TIMED_OUT = "timed_out"
+FAILED = "failed"
+
+ACTIVE_STATES = (PENDING, AWAITING_REPLY)
+
+CONVERSATION_FIELDS = (
+    "id", "campaign_id", "lead_id", "username", "product_summary", "target_description",
+    "intro", "state", "summary", "reply_deadline", "last_incoming_id", "account", "created_at", "updated_at",
+)
+
+
+class ConversationStore(BufferedWriter):
+    """Durable conversation state with buffered, append-only turn writes.
+
+    Conversation creates/updates and new turns are collected in memory and
+    written in one batch per flush, triggered by size or by the background
+    flusher. Reads flush first so they always see the latest state. Storage
+    calls run in a worker thread; subclasses implement them.
+    """
+
+    def __init__(self, flush_size: int = CONVERSATION_FLUSH_SIZE, flush_interval: float = CONVERSATION_FLUSH_INTERVAL,
+                 **kwargs):
+        super().__init__(flush_size, flush_interval, **kwargs)
+        self._upserts: Dict[str, dict] = {}
+        self._turns: List[dict] = []
+
+    # --- Storage hooks ---
+    def _write(self, conversations: List[dict], turns: List[dict]):
+        raise NotImplementedError
+
+    def _read(self, conversation_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def _read_active(self) -> List[dict]:
+        raise NotImplementedError
+
+    def _read_turns(self, conversation_id: str, limit: int) -> List[dict]:
+        raise NotImplementedError
+
+    # --- Buffered writes ---
+    def pending_writes(self) -> int:
+        return len(self._upserts) + len(self._turns)
+
+    def create(self, **fields) -> dict:
+        """Create a conversation in the PENDING state and return it."""
+        now = time.time()
+        conversation = {field: None for field in CONVERSATION_FIELDS}
+        conversation.update(id=uuid.uuid4().hex, state=PENDING, summary="", created_at=now, updated_at=now)
+        conversation.update(fields)
+        self._upserts[conversation["id"]] = dict(conversation)
+        self._maybe_flush()
+        return conversation
+
+    def update(self, conversation_id: str, **fields):
+        """Record changed fields of a conversation."""
+        fields["updated_at"] = time.time()
+        self._upserts.setdefault(conversation_id, {"id": conversation_id}).update(fields)
+        self._maybe_flush()
+
+    def append_turn(self, conversation_id: str, role: str, name: str, text: str):
+        """Append a turn to a conversation's history."""
+        self._turns.append({
+            "conversation_id": conversation_id, "role": role, "name": name,
+            "text": text, "created_at": time.time(),
+        })
+        self._maybe_flush()
+
+    def _take(self):
+        upserts, turns = list(self._upserts.values()), self._turns
+        self._upserts, self._turns = {}, []
+        return upserts, turns
+
+    def _restore(self, batch):
+        upserts, turns = batch
+        # Changes made since the batch was taken apply on top of it
+        restored = {conversation["id"]: conversation for conversation in upserts}
+        for conversation_id, fields in self._upserts.items():
+            restored.setdefault(conversation_id, {}).update(fields)
+        self._upserts = restored
+        self._turns = turns + self._turns
+
+    def _split(self, batch):
+        upserts, turns = batch
+        return [([conversation], []) for conversation in upserts] + [([], [turn]) for turn in turns]
+
+    def _write_batch(self, batch):
+        self._write(*batch)
+
+    # --- Reads ---
+    async def get(self, conversation_id: str) -> Optional[dict]:
+        await self.flush()
+        return await asyncio.to_thread(self._read, conversation_id)
+
+    async def active(self) -> List[dict]:
+        """All conversations that haven't reached a final state."""
+        await self.flush()
+        return await asyncio.to_thread(self._read_active)
+
+    async def recent_turns(self, conversation_id: str, limit: int) -> List[dict]:
+        """The last `limit` turns of a conversation, oldest first."""
+        await self.flush()
+        return await asyncio.to_thread(self._read_turns, conversation_id, limit)
+
+
+class SQLiteConversationStore(ConversationStore):
+    """Conversation store in a local SQLite file."""
+
+    def __init__(self, path: str = CONVERSATION_DB, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                "id TEXT PRIMARY KEY, campaign_id TEXT, lead_id TEXT, username TEXT, product_summary TEXT, "
+                "target_description TEXT, intro TEXT, state TEXT NOT NULL, summary TEXT, reply_deadline REAL, "
+                "last_incoming_id INTEGER, account TEXT, created_at REAL, updated_at REAL)"
+            )
+            # Databases created before multi-account support lack the account column
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(conversations)")}
+            if "account" not in columns:
+                self._conn.execute("ALTER TABLE conversations ADD COLUMN account TEXT")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS conversations_state ON conversations (state)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS conversation_turns ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, conversation_id TEXT NOT NULL, role TEXT, name TEXT, "
+                "text TEXT, created_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS turns_conversation ON conversation_turns (conversation_id, id)")
+            self._conn.commit()
+
+    def _write(self, conversations, turns):
+        with self._lock:
+            try:
+                self._write_rows(conversations, turns)
+            except Exception:
+                # The whole batch is retried, so none of it may be committed later
+                self._conn.rollback()
+                raise
+
+    def _write_rows(self, conversations, turns):
+        for conversation in conversations:
+            columns = list(conversation.keys())
+            if "state" not in conversation:
+                # A partial update of a row created in an earlier flush; an
+                # upsert would trip the NOT NULL on state before the conflict
+                self._conn.execute(
+                    f"UPDATE conversations SET {', '.join(f'{c} = ?' for c in columns if c != 'id')} WHERE id = ?",
+                    [conversation[c] for c in columns if c != "id"] + [conversation["id"]]
+                )
+                continue
+            updates = ", ".join(f"{c} = excluded.{c}" for c in columns if c != "id")
+            self._conn.execute(
+                f"INSERT INTO conversations ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                [conversation[c] for c in columns]
+            )
+        self._conn.executemany(
+            "INSERT INTO conversation_turns (conversation_id, role, name, text, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(t["conversation_id"], t["role"], t["name"], t["text"], t["created_at"]) for t in turns]
+        )
+        self._conn.commit()
+
+    def _read(self, conversation_id):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+        return dict(row) if row else None
+
+    def _read_active(self):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM conversations WHERE state IN ({', '.join('?' for _ in ACTIVE_STATES)}) ORDER BY created_at",
+                ACTIVE_STATES
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _read_turns(self, conversation_id, limit):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT role, name, text FROM conversation_turns WHERE conversation_id = ? ORDER BY id DESC LIMIT ?",
+                (conversation_id, limit)
+            ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+
+class SupabaseConversationStore(ConversationStore):
+    """Conversation store in the Supabase "Conversations" and "ConversationTurns" tables."""
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+
+    def _write(self, conversations, turns):
+        # A bulk upsert takes its columns from the rows, so new rows are
+        # grouped by the set of fields they carry
+        groups: Dict[tuple, List[dict]] = {}
+        for conversation in conversations:
+            if "state" not in conversation:
+                # A partial update of a row created in an earlier flush; an
+                # upsert would trip the NOT NULL on state before the conflict
+                fields = {field: value for field, value in conversation.items() if field != "id"}
+                self.client.table("Conversations").update(fields).eq("id", conversation["id"]).execute()
+                continue
+            groups.setdefault(tuple(sorted(conversation)), []).append(conversation)
+        for rows in groups.values():
+            self.client.table("Conversations").upsert(rows).execute()
+        if turns:
+            self.client.table("ConversationTurns").insert(turns).execute()
+
+    def _read(self, conversation_id):
+        response = self.client.table("Conversations").select("*").eq("id", conversation_id).limit(1).execute()
+        return response.data[0] if response.data else None
+
+    def _read_active(self):
+        response = self.client.table("Conversations").select("*").in_("state", list(ACTIVE_STATES)).order("created_at").execute()
+        return response.data
+
+    def _read_turns(self, conversation_id, limit):
+        response = (
+            self.client.table("ConversationTurns").select("role, name, text")
+            .eq("conversation_id", conversation_id).order("id", desc=True).limit(limit).execute()
+        )
+        return list(reversed(response.data))
+
+
+_store: Optional[ConversationStore] = None
+
+
+def get_conversation_store() -> ConversationStore:
+    """Return the process-wide conversation store selected by CONVERSATION_STORE."""
+    global _store
+    if _store is None:
+        if CONVERSATION_STORE == "supabase":
+            from supabase_client import get_supabase
+            _store = SupabaseConversationStore(get_supabase())
+        else:
+            _store = SQLiteConversationStore()
+    return _store
@@ -0,0 +1,268 @@
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+from buffered_writer import BufferedWriter
+
+logger = logging.getLogger(__name__)
+
+# "sqlite" for local runs, "supabase" in production; follows the conversation store by default
+EVENT_STORE = os.getenv("EVENT_STORE", os.getenv("CONVERSATION_STORE", "sqlite"))
+EVENT_DB = os.getenv("EVENT_DB", "interaction_events.db")
+# Buffered events are written when this many are pending, or every interval
+EVENT_FLUSH_SIZE = int(os.getenv("EVENT_FLUSH_SIZE", "200"))
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "2.0"))
+# Campaigns whose status aggregate is kept in memory
+EVENT_AGGREGATES_RETAINED = int(os.getenv("EVENT_AGGREGATES_RETAINED", "1000"))
+EVENT_READ_PAGE_SIZE = int(os.getenv("EVENT_READ_PAGE_SIZE", "1000"))
+# How often a followed campaign's log is checked for new events
+EVENT_FOLLOW_INTERVAL = float(os.getenv("EVENT_FOLLOW_INTERVAL", "1.0"))
+
+EVENT_FIELDS = ("campaign_id", "conversation_id", "lead_id", "username", "account", "type", "created_at")
+
+
+class CampaignAggregate:
+    """Running status of one campaign: event counts and each conversation's latest status.
+
+    `local_since` is set when this process records the campaign's events; its
+    earlier history is merged in from storage once. Otherwise the aggregate
+    follows storage, and `last_id` is the last event applied from there.
+    """
+
+    def __init__(self, campaign_id: str, local_since: Optional[float] = None):
+        self.campaign_id = campaign_id
+        self.local_since = local_since
+        self.history_loaded = local_since is None
+        self.last_id = 0
+        # Concurrent status queries must not apply the same stored rows twice
+        self.lock = asyncio.Lock()
+        self.statuses: Dict[str, str] = {}
+        self.status_at: Dict[str, float] = {}
+        self.events: Dict[str, int] = {}
+        self.updated_at: Optional[float] = None
+
+    def apply(self, event: dict):
+        self.events[event["type"]] = self.events.get(event["type"], 0) + 1
+        conversation_id = event["conversation_id"]
+        # History can be merged after newer events, so the latest timestamp wins
+        if event["created_at"] >= self.status_at.get(conversation_id, 0.0):
+            self.statuses[conversation_id] = event["type"]
+            self.status_at[conversation_id] = event["created_at"]
+        self.updated_at = max(self.updated_at or 0.0, event["created_at"])
+
+    def snapshot(self) -> dict:
+        counts: Dict[str, int] = {}
+        for status in self.statuses.values():
+            counts[status] = counts.get(status, 0) + 1
+        return {
+            "campaignId": self.campaign_id,
+            "conversations": len(self.statuses),
+            "statuses": counts,
+            "events": dict(self.events),
+            "updatedAt": self.updated_at,
+        }
+
+
+class EventRecorder(BufferedWriter):
+    """Buffered, bulk-written log of interaction events with per-campaign aggregates.
+
+    Events (sends, replies and outcomes) are collected in memory and written
+    in one bulk insert per flush (see BufferedWriter). Each recorded event
+    also updates its campaign's aggregate, so status queries are answered
+    from memory; a campaign recorded by another process (e.g. an outreach
+    worker) is loaded from storage once and then followed by reading only
+    the events added since. Storage calls run in a worker thread; subclasses
+    implement them.
+    """
+
+    def __init__(self, flush_size: int = EVENT_FLUSH_SIZE, flush_interval: float = EVENT_FLUSH_INTERVAL,
+                 retained: int = EVENT_AGGREGATES_RETAINED, **kwargs):
+        super().__init__(flush_size, flush_interval, **kwargs)
+        self.retained = retained
+        self._events: List[dict] = []
+        self._aggregates: "OrderedDict[str, CampaignAggregate]" = OrderedDict()
+
+    # --- Storage hooks ---
+    def _write(self, events: List[dict]):
+        raise NotImplementedError
+
+    def _read(self, campaign_id: str, after_id: int, before: Optional[float], limit: int) -> List[dict]:
+        """Events of a campaign with id > after_id (and created before `before`), oldest first."""
+        raise NotImplementedError
+
+    # --- Buffered writes ---
+    def pending_writes(self) -> int:
+        return len(self._events)
+
+    def record(self, campaign_id: Optional[str], conversation_id: str, lead_id, username: str,
+               event_type: str, account: Optional[str] = None):
+        """Record one interaction event (e.g. "sent", "replied", "agreed")."""
+        event = {
+            "campaign_id": campaign_id, "conversation_id": conversation_id,
+            "lead_id": None if lead_id is None else str(lead_id), "username": username,
+            "account": account, "type": event_type, "created_at": time.time(),
+        }
+        self._events.append(event)
+        if campaign_id:
+            aggregate = self._aggregates.get(campaign_id)
+            if aggregate is None:
+                aggregate = self._retain(CampaignAggregate(campaign_id, local_since=event["created_at"]))
+            elif aggregate.local_since is None:
+                # Followed from storage so far; from now on this process records it
+                aggregate.local_since = event["created_at"]
+            self._aggregates.move_to_end(campaign_id)
+            aggregate.apply(event)
+        self._maybe_flush()
+
+    def _retain(self, aggregate: CampaignAggregate) -> CampaignAggregate:
+        self._aggregates[aggregate.campaign_id] = aggregate
+        while len(self._aggregates) > self.retained:
+            self._aggregates.popitem(last=False)
+        return aggregate
+
+    def _take(self) -> List[dict]:
+        events, self._events = self._events, []
+        return events
+
+    def _restore(self, batch):
+        self._events = batch + self._events
+
+    def _split(self, batch):
+        return [[event] for event in batch]
+
+    def _write_batch(self, batch):
+        self._write(batch)
+
+    # --- Status queries ---
+    async def _load(self, aggregate: CampaignAggregate, before: Optional[float] = None, after_id: int = 0) -> int:
+        """Apply stored events a page at a time; returns the last id read."""
+        while True:
+            rows = await asyncio.to_thread(self._read, aggregate.campaign_id, after_id, before, EVENT_READ_PAGE_SIZE)
+            for row in rows:
+                aggregate.apply(row)
+                after_id = row["id"]
+            if len(rows) < EVENT_READ_PAGE_SIZE:
+                return after_id
+
+    async def campaign_status(self, campaign_id: str) -> dict:
+        """
+        Current status of a campaign from its in-memory aggregate.
+
+        Returns:
+            {"campaignId", "conversations", "statuses": latest status -> count,
+             "events": event type -> count, "updatedAt"}
+        """
+        aggregate = self._aggregates.get(campaign_id)
+        if aggregate is None:
+            aggregate = self._retain(CampaignAggregate(campaign_id))
+        self._aggregates.move_to_end(campaign_id)
+        async with aggregate.lock:
+            if aggregate.local_since is None:
+                # Recorded elsewhere: read only what was added since the last query
+                aggregate.last_id = await self._load(aggregate, after_id=aggregate.last_id)
+            elif not aggregate.history_loaded:
+                # Events from before this process started recording the campaign
+                await self._load(aggregate, before=aggregate.local_since)
+                aggregate.history_loaded = True
+        return aggregate.snapshot()
+
+
+    async def follow(self, campaign_id: str, poll_interval: float = EVENT_FOLLOW_INTERVAL) -> AsyncIterator[dict]:
+        """
+        A campaign's stored events, oldest first, then new ones as they are written.
+
+        Serves status updates recorded by other processes (the outreach
+        workers in queue mode), in the CampaignEventBus event format. New
+        events show up once their writer flushes.
+        """
+        after_id = 0
+        while True:
+            rows = await asyncio.to_thread(self._read, campaign_id, after_id, None, EVENT_READ_PAGE_SIZE)
+            for row in rows:
+                after_id = row["id"]
+                yield {
+                    "campaignId": row["campaign_id"], "conversationId": row["conversation_id"],
+                    "leadId": row["lead_id"], "username": row["username"],
+                    "status": row["type"], "at": row["created_at"],
+                }
+            if len(rows) < EVENT_READ_PAGE_SIZE:
+                await asyncio.sleep(poll_interval)
+
+
+class SQLiteEventRecorder(EventRecorder):
+    """Event log in a local SQLite file."""
+
+    def __init__(self, path: str = EVENT_DB, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS interaction_events ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, campaign_id TEXT, conversation_id TEXT, lead_id TEXT, "
+                "username TEXT, account TEXT, type TEXT NOT NULL, created_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS events_campaign ON interaction_events (campaign_id, id)")
+            self._conn.commit()
+
+    def _write(self, events):
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    f"INSERT INTO interaction_events ({', '.join(EVENT_FIELDS)}) VALUES ({', '.join('?' for _ in EVENT_FIELDS)})",
+                    [[event[field] for field in EVENT_FIELDS] for event in events]
+                )
+                self._conn.commit()
+            except Exception:
+                # The batch is retried whole
+                self._conn.rollback()
+                raise
+
+    def _read(self, campaign_id, after_id, before, limit):
+        query = "SELECT * FROM interaction_events WHERE campaign_id = ? AND id > ?"
+        params = [campaign_id, after_id]
+        if before is not None:
+            query += " AND created_at < ?"
+            params.append(before)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id LIMIT ?", params + [limit]).fetchall()
+        return [dict(row) for row in rows]
+
+
+class SupabaseEventRecorder(EventRecorder):
+    """Event log in the Supabase "InteractionEvents" table."""
+
+    def __init__(self, client, **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+
+    def _write(self, events):
+        self.client.table("InteractionEvents").insert(events).execute()
+
+    def _read(self, campaign_id, after_id, before, limit):
+        query = self.client.table("InteractionEvents").select("*").eq("campaign_id", campaign_id).gt("id", after_id)
+        if before is not None:
+            query = query.lt("created_at", before)
+        return query.order("id").limit(limit).execute().data
+
+
+_recorder: Optional[EventRecorder] = None
+
+
+def get_event_recorder() -> EventRecorder:
+    """Return the process-wide event recorder selected by EVENT_STORE."""
+    global _recorder
+    if _recorder is None:
+        if EVENT_STORE == "supabase":
+            from supabase_client import get_supabase
+            _recorder = SupabaseEventRecorder(get_supabase())
+        else:
+            _recorder = SQLiteEventRecorder()
+    return _recorder
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# "sqlite" is the only backend for now; JobQueue is the interface to implement for others
+JOB_QUEUE = os.getenv("JOB_QUEUE", "sqlite")
+JOB_QUEUE_DB = os.getenv("JOB_QUEUE_DB", "jobs.db")
+# A leased job is redelivered if its lease isn't extended within this time
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "5"))
+
+# Job states
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+DEAD = "dead"
+
+
+class JobQueue:
+    """Durable work queue with leases and at-least-once delivery.
+
+    A worker leases jobs for a limited time and must extend the lease while
+    it works. A job whose lease runs out (the worker died or hung) becomes
+    available again, so every job is delivered at least once and handlers
+    must be idempotent. Failed jobs are retried with backoff until they run
+    out of attempts. Jobs can carry a partition, and a worker only leases
+    jobs of its own partitions or of none.
+    """
+
+    def enqueue(self, kind: str, payload: dict, partition: Optional[str] = None, delay: float = 0.0) -> int:
+        """Add a job and return its id."""
+        raise NotImplementedError
+
+    def lease(self, worker_id: str, limit: int = 1, lease_seconds: float = JOB_LEASE_SECONDS,
+              partitions: Optional[List[str]] = None) -> List[dict]:
+        """
+        Lease up to `limit` available jobs.
+
+        Args:
+            worker_id: Identifies the lease holder
+            limit: Maximum number of jobs to lease
+            lease_seconds: How long the jobs stay leased without an extension
+            partitions: Partitions this worker accepts, besides unpartitioned jobs
+
+        Returns:
+            Leased jobs with "id", "kind", "payload", "partition" and "attempts"
+        """
+        raise NotImplementedError
+
+    def extend(self, job_id: int, worker_id: str, lease_seconds: float = JOB_LEASE_SECONDS) -> bool:
+        """Extend a lease; False if the worker no longer holds it."""
+        raise NotImplementedError
+
+    def complete(self, job_id: int, worker_id: str):
+        raise NotImplementedError
+
+    def fail(self, job_id: int, worker_id: str, error: str):
+        """Schedule a retry with backoff, or give up once attempts are exhausted."""
+        raise NotImplementedError
+
+    def release(self, job_id: int, worker_id: str):
+        """Hand a job back without counting the attempt (e.g. on shutdown)."""
+        raise NotImplementedError
+
+    def active_payloads(self, kind: str) -> List[dict]:
+        """Payloads of the jobs of a kind that are queued or leased."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class SQLiteJobQueue(JobQueue):
+    """Job queue in a SQLite file shared by the API and worker processes."""
+
+    def __init__(self, path: str = JOB_QUEUE_DB, max_attempts: int = JOB_MAX_ATTEMPTS,
+                 retry_backoff: float = JOB_RETRY_BACKOFF_SECONDS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "partition TEXT, state TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "available_at REAL NOT NULL, lease_owner TEXT, lease_expires REAL, last_error TEXT, "
+                "created_at REAL, updated_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_available ON jobs (state, available_at)")
+
+    def enqueue(self, kind, payload, partition=None, delay=0.0):
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, payload, partition, state, available_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), partition, QUEUED, now + delay, now, now)
+            )
+        return cursor.lastrowid
+
+    def lease(self, worker_id, limit=1, lease_seconds=JOB_LEASE_SECONDS, partitions=None):
+        now = time.time()
+        partition_clause = "partition IS NULL"
+        params = [QUEUED, now, LEASED, now]
+        if partitions:
+            partition_clause = f"(partition IS NULL OR partition IN ({', '.join('?' for _ in partitions)}))"
+            params.extend(partitions)
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two workers can't lease the same job
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, kind, payload, partition, attempts FROM jobs "
+                    f"WHERE ((state = ? AND available_at <= ?) OR (state = ? AND lease_expires < ?)) AND {partition_clause} "
+                    "ORDER BY id LIMIT ?",
+                    params + [limit]
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, "
+                    "updated_at = ? WHERE id = ?",
+                    [(LEASED, worker_id, now + lease_seconds, now, row["id"]) for row in rows]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {"id": row["id"], "kind": row["kind"], "payload": json.loads(row["payload"]),
+             "partition": row["partition"], "attempts": row["attempts"] + 1}
+            for row in rows
+        ]
+
+    def _update_owned(self, job_id, worker_id, assignments: str, params: list) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ? AND state = ? AND lease_owner = ?",
+                params + [time.time(), job_id, LEASED, worker_id]
+            )
+        return cursor.rowcount == 1
+
+    def extend(self, job_id, worker_id, lease_seconds=JOB_LEASE_SECONDS):
+        return self._update_owned(job_id, worker_id, "lease_expires = ?", [time.time() + lease_seconds])
+
+    def complete(self, job_id, worker_id):
+        self._update_owned(job_id, worker_id, "state = ?, lease_owner = NULL, lease_expires = NULL", [DONE])
+
+    def fail(self, job_id, worker_id, error):
+        with self._lock:
+            row = self._conn.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        if row["attempts"] >= self.max_attempts:
+            logger.error(f"Job {job_id} failed {row['attempts']} times, giving up: {error}")
+            self._update_owned(job_id, worker_id, "state = ?, lease_owner = NULL, last_error = ?", [DEAD, error])
+            return
+        delay = self.retry_backoff * (2 ** (row["attempts"] - 1))
+        self._update_owned(
+            job_id, worker_id, "state = ?, lease_owner = NULL, lease_expires = NULL, available_at = ?, last_error = ?",
+            [QUEUED, time.time() + delay, error]
+        )
+
+    def release(self, job_id, worker_id):
+        self._update_owned(
+            job_id, worker_id,
+            "state = ?, lease_owner = NULL, lease_expires = NULL, available_at = ?, attempts = MAX(0, attempts - 1)",
+            [QUEUED, time.time()]
+        )
+
+    def active_payloads(self, kind):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT payload FROM jobs WHERE kind = ? AND state IN (?, ?)", (kind, QUEUED, LEASED)
+            ).fetchall()
+        return [json.loads(row["payload"]) for row in rows]
+
+    def stats(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) AS count FROM jobs GROUP BY state").fetchall()
+        counts = {QUEUED: 0, LEASED: 0, DONE: 0, DEAD: 0}
+        counts.update({row["state"]: row["count"] for row in rows})
+        return counts
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue selected by JOB_QUEUE."""
+    global _queue
+    if _queue is None:
+        if JOB_QUEUE != "sqlite":
+            raise ValueError(f"Unknown JOB_QUEUE backend: {JOB_QUEUE}")
+        _queue = SQLiteJobQueue()
+    return _queue
@@ -0,0 +1,188 @@
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from lead_reader import MATCH_COLUMNS, LeadReader
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) the index pulls new rows from Supabase, and how often it
+# throws everything away and rebuilds to pick up edited or deleted leads.
+LEAD_INDEX_REFRESH_SECONDS = float(os.getenv("LEAD_INDEX_REFRESH_SECONDS", "30"))
+LEAD_INDEX_FULL_REFRESH_SECONDS = float(os.getenv("LEAD_INDEX_FULL_REFRESH_SECONDS", "900"))
+
+# Lead fields whose values are matched against the campaign summary
+MATCH_FIELDS = ("domain", "role")
+
+
+def normalize_term(text) -> str:
+    """Lowercase and collapse whitespace so terms and summaries compare alike."""
+    if not text:
+        return ""
+    return " ".join(str(text).lower().split())
+
+
+class _Automaton:
+    """Aho-Corasick automaton over a fixed set of terms.
+
+    Scanning a text costs O(len(text) + number of matches), independent of
+    how many terms were inserted.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        # Term ending exactly at this state, and the nearest suffix state that ends a term
+        self.term: List[Optional[str]] = [None]
+        self.out_link: List[int] = [0]
+
+        for term in terms:
+            self._insert(term)
+        self._build_links()
+
+    def _insert(self, term: str):
+        state = 0
+        for ch in term:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.term.append(None)
+                self.out_link.append(0)
+                self.goto[state][ch] = nxt
+            state = nxt
+        self.term[state] = term
+
+    def _build_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[nxt] = target if target != nxt else 0
+                link = self.fail[nxt]
+                self.out_link[nxt] = link if self.term[link] is not None else self.out_link[link]
+
+    def find(self, text: str) -> Set[str]:
+        """Return every inserted term that occurs as a substring of text."""
+        found = set()
+        state = 0
+        goto, fail, term, out_link = self.goto, self.fail, self.term, self.out_link
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if term[state] is not None else out_link[state]
+            while hit:
+                if term[hit] in found:
+                    # Everything further along the suffix chain was already reported
+                    break
+                found.add(term[hit])
+                hit = out_link[hit]
+        return found
+
+
+class LeadIndex:
+    """In-process index of PotentialLeads keyed by normalized domain/role terms.
+
+    The index is built once from a projected, keyset-paginated read of the
+    lead table and then refreshed incrementally by reading only rows with an
+    id above the highest one already indexed. It holds lead ids, not rows.
+    Matching a summary scans it once with an Aho-Corasick automaton, so the
+    cost depends on the summary length rather than the size of the lead table;
+    full rows are fetched lazily for the matched ids only.
+    """
+
+    def __init__(self, client, table: str = "PotentialLeads"):
+        self.reader = LeadReader(client, table)
+        self._lock = threading.Lock()
+        # Launches match in worker threads; only one of them refreshes at a time
+        self._refresh_lock = threading.Lock()
+        self._postings: Dict[str, List[object]] = {}
+        self._count = 0
+        self._automaton: Optional[_Automaton] = None
+        self._max_id = None
+        self._last_refresh = 0.0
+        self._last_full_refresh = 0.0
+
+    @staticmethod
+    def _add_page(page: List[dict], postings: Dict[str, List[object]]):
+        for row in page:
+            lead_id = row.get("id")
+            terms = {normalize_term(row.get(field, "")) for field in MATCH_FIELDS}
+            for term in terms:
+                if term:
+                    postings.setdefault(term, []).append(lead_id)
+
+    def rebuild(self):
+        """Rebuild the whole index from the lead table."""
+        postings: Dict[str, List[object]] = {}
+        count = 0
+        max_id = None
+        for page in self.reader.iter_pages(MATCH_COLUMNS):
+            self._add_page(page, postings)
+            count += len(page)
+            max_id = page[-1].get("id")
+        automaton = _Automaton(postings.keys())
+        with self._lock:
+            self._postings = postings
+            self._count = count
+            self._automaton = automaton
+            self._max_id = max_id
+            self._last_refresh = self._last_full_refresh = time.monotonic()
+        logger.info(f"Lead index rebuilt with {count} leads and {len(postings)} terms")
+
+    def refresh(self, force: bool = False):
+        """Bring the index up to date, rebuilding or fetching new rows as needed."""
+        with self._refresh_lock:
+            self._refresh(force)
+
+    def _refresh(self, force: bool):
+        now = time.monotonic()
+        if self._automaton is None or now - self._last_full_refresh >= LEAD_INDEX_FULL_REFRESH_SECONDS:
+            self.rebuild()
+            return
+        if not force and now - self._last_refresh < LEAD_INDEX_REFRESH_SECONDS:
+            return
+
+        added = 0
+        for page in self.reader.iter_pages(MATCH_COLUMNS, after_id=self._max_id):
+            with self._lock:
+                postings = self._postings
+                before = len(postings)
+                self._add_page(page, postings)
+                self._count += len(page)
+                self._max_id = page[-1].get("id")
+                # Only new terms require a new automaton; new leads on known terms just extend postings
+                if len(postings) != before:
+                    self._automaton = _Automaton(postings.keys())
+            added += len(page)
+        self._last_refresh = now
+        if added:
+            logger.info(f"Lead index picked up {added} new leads")
+
+    def match_ids(self, summary: str) -> List[object]:
+        """Return ids of leads whose domain or role appears in the summary, in id order."""
+        text = normalize_term(summary)
+        with self._lock:
+            automaton = self._automaton
+            if automaton is None or not text:
+                return []
+            lead_ids = set()
+            for term in automaton.find(text):
+                lead_ids.update(self._postings.get(term, ()))
+        return sorted(lead_ids)
+
+    def match(self, summary: str) -> Iterator[dict]:
+        """Yield full rows of the matching leads, fetched a page at a time."""
+        return self.reader.fetch_by_ids(self.match_ids(summary))
+
+    def __len__(self):
+        return self._count
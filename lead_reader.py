@@ -0,0 +1,111 @@
+import os
+import logging
+from typing import Iterable, Iterator, List, Sequence
+from metrics import LEAD_FETCH_LATENCY
+
+logger = logging.getLogger(__name__)
+
+LEAD_PAGE_SIZE = int(os.getenv("LEAD_PAGE_SIZE", "1000"))
+# Ids per by-id request: they all go into the URL's in.(...) filter, and
+# too many UUIDs there make PostgREST answer 414 URI Too Long
+LEAD_FETCH_BY_ID_CHUNK = int(os.getenv("LEAD_FETCH_BY_ID_CHUNK", "150"))
+# Columns needed to match leads; everything else is fetched only for matches
+MATCH_COLUMNS = ("id", "domain", "role")
+
+
+class LeadReader:
+    """Reads PotentialLeads page by page with keyset pagination.
+
+    Pages are ordered by id and each one starts after the last id of the
+    previous page, so every page costs the same however deep into the table
+    it is, and only one page is held in memory at a time.
+    """
+
+    def __init__(self, client, table: str = "PotentialLeads", page_size: int = LEAD_PAGE_SIZE,
+                 id_chunk_size: int = LEAD_FETCH_BY_ID_CHUNK):
+        self.client = client
+        self.table = table
+        self.page_size = page_size
+        self.id_chunk_size = id_chunk_size
+
+    def iter_pages(self, columns: Sequence[str] = MATCH_COLUMNS, after_id=None) -> Iterator[List[dict]]:
+        """
+        Yield pages of rows with id greater than after_id.
+
+        Args:
+            columns: Columns to select ("id" is always included)
+            after_id: Keyset cursor; None starts from the beginning
+        """
+        select = ",".join(dict.fromkeys(("id",) + tuple(columns)))
+        while True:
+            query = self.client.table(self.table).select(select).order("id").limit(self.page_size)
+            if after_id is not None:
+                query = query.gt("id", after_id)
+            with LEAD_FETCH_LATENCY.labels(query="page").time():
+                response = query.execute()
+            page = response.data if hasattr(response, 'data') else response
+            if not page:
+                return
+            yield page
+            after_id = page[-1].get("id")
+            if len(page) < self.page_size:
+                return
+
+    def iter_pages_changed(self, columns: Sequence[str], column: str, since=None, after_id=None) -> Iterator[List[dict]]:
+        """
+        Yield pages of rows changed after a (timestamp, id) cursor, oldest change first.
+
+        Rows updated by one statement share a timestamp, so the id breaks ties
+        and a page boundary never skips any of them. Rows where `column` is
+        NULL are left out, since they can't be placed after a cursor.
+
+        Args:
+            columns: Columns to select ("id" and `column` are always included)
+            column: Timestamp column set on every insert and update (e.g. "updated_at")
+            since: Timestamp of the last row read; None starts from the beginning
+            after_id: Id of the last row read
+        """
+        select = ",".join(dict.fromkeys(("id", column) + tuple(columns)))
+        while True:
+            query = (self.client.table(self.table).select(select).filter(column, "not.is", "null")
+                     .order(column).order("id").limit(self.page_size))
+            if since is not None:
+                query = query.or_(f'{column}.gt."{since}",and({column}.eq."{since}",id.gt.{after_id})')
+            with LEAD_FETCH_LATENCY.labels(query="changed").time():
+                response = query.execute()
+            page = response.data if hasattr(response, 'data') else response
+            if not page:
+                return
+            yield page
+            cursor = (page[-1].get(column), page[-1].get("id"))
+            # A cursor that didn't move would read the same page forever
+            if len(page) < self.page_size or cursor[0] is None or cursor == (since, after_id):
+                return
+            since, after_id = cursor
+
+    def iter_rows(self, columns: Sequence[str] = MATCH_COLUMNS, after_id=None) -> Iterator[dict]:
+        """Yield rows one at a time (see iter_pages)."""
+        for page in self.iter_pages(columns, after_id):
+            yield from page
+
+    def iter_pages_by_ids(self, ids: Iterable, columns: str = "*") -> Iterator[List[dict]]:
+        """
+        Fetch full rows for the given ids, a chunk of id_chunk_size at a time, in the given order.
+
+        Args:
+            ids: Lead ids to fetch
+            columns: Column list for the select
+        """
+        ids = list(ids)
+        for start in range(0, len(ids), self.id_chunk_size):
+            chunk = ids[start:start + self.id_chunk_size]
+            with LEAD_FETCH_LATENCY.labels(query="by_ids").time():
+                response = self.client.table(self.table).select(columns).in_("id", chunk).execute()
+            rows = response.data if hasattr(response, 'data') else response
+            by_id = {row.get("id"): row for row in rows}
+            yield [by_id[lead_id] for lead_id in chunk if lead_id in by_id]
+
+    def fetch_by_ids(self, ids: Iterable, columns: str = "*") -> Iterator[dict]:
+        """Yield full rows one at a time (see iter_pages_by_ids)."""
+        for page in self.iter_pages_by_ids(ids, columns):
+            yield from page
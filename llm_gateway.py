@@ -0,0 +1,204 @@
+import os
+import asyncio
+import random
+import logging
+from typing import Callable, Dict, Optional, Union
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Per-call deadline, retry policy and default per-provider concurrency
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_BACKOFF_SECONDS = float(os.getenv("LLM_BACKOFF_SECONDS", "0.5"))
+LLM_DEFAULT_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+
+
+class LLMError(Exception):
+    """Raised when an LLM call fails after all retries."""
+
+
+class LLMProvider:
+    """Base class for LLM providers used by the gateway."""
+
+    name = "base"
+    default_model = None
+
+    async def generate(self, prompt: str, model: Optional[str] = None, system: Optional[str] = None,
+                       max_tokens: Optional[int] = None) -> str:
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through the async generate_content API."""
+
+    name = "gemini"
+    default_model = "gemini-1.5-flash"
+
+    def __init__(self, api_key: Optional[str] = None, genai=None):
+        # genai can be swapped for a stand-in module (see benchmarks/fakes.py)
+        if genai is None:
+            import google.generativeai as genai
+        self.genai = genai
+        self.genai.configure(api_key=api_key or os.getenv("GEMINI_API_KEY"))
+        self._models = {}
+
+    async def generate(self, prompt, model=None, system=None, max_tokens=None):
+        model_name = model or self.default_model
+        key = (model_name, system)
+        if key not in self._models:
+            self._models[key] = self.genai.GenerativeModel(model_name, system_instruction=system)
+        config = {"max_output_tokens": max_tokens} if max_tokens else None
+        response = await self._models[key].generate_content_async(prompt, generation_config=config)
+        return response.text.strip()
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions through the async client."""
+
+    name = "openai"
+    default_model = "gpt-4o-mini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        import openai
+        self.client = openai.AsyncOpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+
+    async def generate(self, prompt, model=None, system=None, max_tokens=None):
+        messages = []
+        if system:
+            messages.append({"role": "system", "content": system})
+        messages.append({"role": "user", "content": prompt})
+        response = await self.client.chat.completions.create(
+            model=model or self.default_model,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+        return response.choices[0].message.content.strip()
+
+
+class FakeProvider(LLMProvider):
+    """Local stand-in provider for tests and benchmarks.
+
+    Args:
+        reply: Fixed text, or a callable taking the prompt and returning text
+        latency: Seconds to sleep before answering
+        failures: Number of initial calls that raise before succeeding
+        name: Name to register the provider under
+    """
+
+    def __init__(self, reply: Union[str, Callable[[str], str]] = "OK", latency: float = 0.0,
+                 failures: int = 0, name: str = "fake"):
+        self.name = name
+        self.reply = reply
+        self.latency = latency
+        self.failures = failures
+        self.calls = 0
+
+    async def generate(self, prompt, model=None, system=None, max_tokens=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.failures > 0:
+            self.failures -= 1
+            raise RuntimeError(f"{self.name} provider failure")
+        return self.reply(prompt) if callable(self.reply) else self.reply
+
+
+class LLMGateway:
+    """Non-blocking front door for every LLM call in the app.
+
+    Each provider gets its own semaphore so a burst of conversations can't
+    open unbounded concurrent requests, every attempt runs under a deadline,
+    and failed attempts are retried with exponential backoff and jitter.
+    """
+
+    def __init__(self, timeout: float = LLM_TIMEOUT_SECONDS, max_retries: int = LLM_MAX_RETRIES,
+                 backoff: float = LLM_BACKOFF_SECONDS):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.providers: Dict[str, LLMProvider] = {}
+        self._factories: Dict[str, Callable[[], LLMProvider]] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def register(self, provider: Union[LLMProvider, Callable[[], LLMProvider]], name: Optional[str] = None,
+                 concurrency: Optional[int] = None):
+        """
+        Register a provider instance, or a factory that builds it on first use.
+
+        Args:
+            provider: LLMProvider instance or zero-argument factory
+            name: Name to register under (defaults to provider.name)
+            concurrency: Max in-flight calls for this provider
+        """
+        name = name or provider.name
+        if isinstance(provider, LLMProvider):
+            self.providers[name] = provider
+        else:
+            self._factories[name] = provider
+        if concurrency is None:
+            concurrency = int(os.getenv(f"LLM_CONCURRENCY_{name.upper()}", LLM_DEFAULT_CONCURRENCY))
+        self._semaphores[name] = asyncio.Semaphore(concurrency)
+
+    def get_provider(self, name: str) -> LLMProvider:
+        if name not in self.providers:
+            if name not in self._factories:
+                raise LLMError(f"Unknown provider: {name}")
+            self.providers[name] = self._factories.pop(name)()
+        return self.providers[name]
+
+    async def generate(self, prompt: str, provider: str = "gemini", model: Optional[str] = None,
+                       system: Optional[str] = None, max_tokens: Optional[int] = None,
+                       timeout: Optional[float] = None, max_retries: Optional[int] = None) -> str:
+        """
+        Run a prompt through a provider without blocking the event loop.
+
+        Args:
+            prompt: The user prompt
+            provider: Registered provider name
+            model: Model override (provider default when omitted)
+            system: Optional system instruction
+            max_tokens: Optional output token cap
+            timeout: Per-attempt deadline in seconds
+            max_retries: Retry override for this call
+
+        Returns:
+            The generated text
+
+        Raises:
+            LLMError: if every attempt fails or times out
+        """
+        llm = self.get_provider(provider)
+        deadline = timeout or self.timeout
+        retries = self.max_retries if max_retries is None else max_retries
+        last_error = None
+        for attempt in range(retries + 1):
+            if attempt:
+                delay = self.backoff * (2 ** (attempt - 1))
+                await asyncio.sleep(delay + random.uniform(0, delay))
+            try:
+                async with self._semaphores[provider]:
+                    return await asyncio.wait_for(
+                        llm.generate(prompt, model=model, system=system, max_tokens=max_tokens),
+                        timeout=deadline
+                    )
+            except asyncio.TimeoutError:
+                last_error = f"timed out after {deadline}s"
+            except Exception as e:
+                last_error = str(e)
+            logger.warning(f"LLM call to {provider} failed (attempt {attempt + 1}/{retries + 1}): {last_error}")
+        raise LLMError(f"{provider} failed after {retries + 1} attempts: {last_error}")
+
+
+_gateway: Optional[LLMGateway] = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    """Return the process-wide gateway with the Gemini and OpenAI providers registered."""
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+        _gateway.register(GeminiProvider, name="gemini")
+        _gateway.register(OpenAIProvider, name="openai")
+    return _gateway
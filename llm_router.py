@@ -0,0 +1,204 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, List, Optional
+from llm_gateway import LLMError, LLMGateway, get_llm_gateway
+from metrics import LLM_ERRORS, LLM_HEDGES, LLM_LATENCY, span
+
+logger = logging.getLogger(__name__)
+
+# Consecutive failures that take a provider out of rotation, and for how long
+LLM_FAILURE_THRESHOLD = int(os.getenv("LLM_FAILURE_THRESHOLD", "3"))
+LLM_COOLDOWN_SECONDS = float(os.getenv("LLM_COOLDOWN_SECONDS", "30"))
+# Hedging fires the next provider once the first has run longer than its p95
+# latency; until enough samples exist the fixed delay is used instead
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "2.0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "200"))
+
+
+class ProviderHealth:
+    """Recent latency and failure record of one provider."""
+
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.successes = 0
+        self.failures = 0
+
+    def record_success(self, latency: float):
+        self.latencies.append(latency)
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.successes += 1
+
+    def record_failure(self, threshold: int = LLM_FAILURE_THRESHOLD, cooldown: float = LLM_COOLDOWN_SECONDS):
+        self.consecutive_failures += 1
+        self.failures += 1
+        if self.consecutive_failures >= threshold:
+            self.down_until = time.monotonic() + cooldown
+
+    def available(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def p95(self) -> Optional[float]:
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def snapshot(self) -> dict:
+        return {
+            "available": self.available(),
+            "consecutiveFailures": self.consecutive_failures,
+            "successes": self.successes,
+            "failures": self.failures,
+            "p95Seconds": self.p95(),
+        }
+
+
+class LLMRouter:
+    """Routes each LLM call across providers with failover and hedging.
+
+    Providers are tried in preference order, skipping any that failed
+    repeatedly until their cooldown ends. If the running call fails the next
+    provider takes over; with hedging on, the next provider is also started
+    once the running call is slower than its provider's p95, and whichever
+    answers first wins while the other is cancelled.
+
+    Args:
+        gateway: LLMGateway the providers are registered on
+        providers: Provider names in preference order
+        models: Model per provider (provider default when missing)
+        hedge: Whether to send hedged requests
+    """
+
+    def __init__(self, gateway: LLMGateway, providers: List[str], models: Optional[Dict[str, str]] = None,
+                 hedge: bool = LLM_HEDGE, hedge_delay: float = LLM_HEDGE_DELAY_SECONDS,
+                 hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.gateway = gateway
+        self.providers = list(providers)
+        self.models = models or {}
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.health: Dict[str, ProviderHealth] = {name: ProviderHealth() for name in self.providers}
+
+    def candidates(self, providers: Optional[List[str]] = None) -> List[str]:
+        """Providers to try, healthy ones first; unhealthy ones stay as a last resort."""
+        names = providers or self.providers
+        for name in names:
+            self.health.setdefault(name, ProviderHealth())
+        healthy = [name for name in names if self.health[name].available()]
+        return healthy + [name for name in names if name not in healthy]
+
+    def _hedge_after(self, name: str) -> float:
+        health = self.health[name]
+        if len(health.latencies) < self.hedge_min_samples:
+            return self.hedge_delay
+        return health.p95()
+
+    async def _call(self, name: str, prompt: str, retries: Optional[int], kind: str, **kwargs) -> str:
+        health = self.health[name]
+        start = time.monotonic()
+        try:
+            with span(f"llm.{kind}", provider=name):
+                text = await self.gateway.generate(prompt, provider=name, model=self.models.get(name),
+                                                   max_retries=retries, **kwargs)
+        except Exception:
+            health.record_failure()
+            LLM_ERRORS.labels(provider=name, prompt=kind).inc()
+            raise
+        latency = time.monotonic() - start
+        health.record_success(latency)
+        LLM_LATENCY.labels(provider=name, prompt=kind).observe(latency)
+        return text
+
+    async def generate(self, prompt: str, system: Optional[str] = None, max_tokens: Optional[int] = None,
+                       timeout: Optional[float] = None, providers: Optional[List[str]] = None,
+                       kind: str = "other") -> str:
+        """
+        Run a prompt on the best available provider.
+
+        Args:
+            prompt: The user prompt
+            system: Optional system instruction
+            max_tokens: Optional output token cap
+            timeout: Per-attempt deadline in seconds
+            providers: Restrict the call to these providers, in this order
+            kind: Prompt type, used to label metrics and trace spans
+
+        Returns:
+            The first successful answer
+
+        Raises:
+            LLMError: if every provider fails
+        """
+        remaining = self.candidates(providers)
+        # With a single provider its own retries apply; otherwise failing over
+        # to the next provider replaces retrying the same one
+        retries = None if len(remaining) == 1 else 0
+        kwargs = {"system": system, "max_tokens": max_tokens, "timeout": timeout}
+        running: Dict[asyncio.Task, str] = {}
+        errors = []
+
+        def launch():
+            name = remaining.pop(0)
+            running[asyncio.ensure_future(self._call(name, prompt, retries, kind, **kwargs))] = name
+
+        launch()
+        try:
+            while running:
+                wait = None
+                if self.hedge and remaining and len(running) == 1:
+                    wait = self._hedge_after(next(iter(running.values())))
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"Hedging slow {next(iter(running.values()))} call with {remaining[0]}")
+                    LLM_HEDGES.labels(prompt=kind).inc()
+                    launch()
+                    continue
+                for task in done:
+                    name = running.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(f"{name}: {task.exception()}")
+                    logger.warning(f"LLM provider {name} failed, failing over: {task.exception()}")
+                if not running and remaining:
+                    launch()
+        finally:
+            for task in running:
+                task.cancel()
+        raise LLMError(f"All LLM providers failed: {'; '.join(errors)}")
+
+    def stats(self) -> dict:
+        return {name: health.snapshot() for name, health in self.health.items()}
+
+
+def _configured_providers() -> List[str]:
+    """Provider order from LLM_PROVIDERS, or every provider that has an API key."""
+    configured = os.getenv("LLM_PROVIDERS")
+    if configured:
+        return [name.strip() for name in configured.split(",") if name.strip()]
+    providers = [name for name, key in (("gemini", "GEMINI_API_KEY"), ("openai", "OPENAI_API_KEY")) if os.getenv(key)]
+    return providers or ["gemini"]
+
+
+_router: Optional[LLMRouter] = None
+
+
+def get_llm_router() -> LLMRouter:
+    """Return the process-wide router over the shared gateway."""
+    global _router
+    if _router is None:
+        providers = _configured_providers()
+        models = {name: os.getenv(f"LLM_MODEL_{name.upper()}") for name in providers}
+        _router = LLMRouter(get_llm_gateway(), providers,
+                            models={name: model for name, model in models.items() if model})
+    return _router
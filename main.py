@@ -1,19 +1,78 @@
-from supabase_client import supabase
+from supabase_client import get_supabase
 # from typing import Any
 from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List
 import os
-import openai
-import google.generativeai as genai
+import json
+import uuid
+import itertools
+import logging
 from dotenv import load_dotenv
 # import sys
 import asyncio
 # sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../tg_agent')))
-from tg_agent import run_telegram_agent 
+from contextlib import asynccontextmanager
+from campaign_scheduler import OUTREACH_MODE, get_campaign_scheduler
+from job_queue import get_job_queue
+from conversation_store import get_conversation_store
+from lead_index import LeadIndex
+from llm_router import get_llm_router
+from campaign_events import get_event_bus, sse_events, sse_stream
+from event_recorder import get_event_recorder
+from response_cache import ResponseCache, SQLiteCacheBackend, make_cache_key
+import metrics
+from metrics import LEAD_MATCH_LATENCY
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+
+# Heavy SDKs (telethon, supabase, numpy, the LLM clients) are imported when a
+# route or the lifespan first needs them. WARMUP_ON_STARTUP=1 loads them and
+# builds the lead index during startup instead of on the first requests.
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+
+def warm_up():
+    """Create the clients and lead index that requests would otherwise build on first use."""
+    router = get_llm_router()
+    for name in router.providers:
+        try:
+            router.gateway.get_provider(name)
+        except Exception as e:
+            logger.warning(f"Warm-up of LLM provider {name} failed: {e}")
+    try:
+        get_lead_index().refresh()
+    except Exception as e:
+        logger.warning(f"Warm-up of the lead index failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In queue mode the outreach workers own the Telegram accounts and
+    # unfinished conversations; this process only enqueues campaigns
+    inline = OUTREACH_MODE != "queue"
+    if inline:
+        # Connect each Telegram account's shared client once; conversations reuse them.
+        # Accounts that fail to start are logged and retried on first use.
+        from account_pool import get_account_pool
+        accounts = get_account_pool()
+        await accounts.start()
+    if WARMUP_ON_STARTUP:
+        await asyncio.to_thread(warm_up)
+    # Pick up every conversation a previous run left unfinished
+    store = get_conversation_store()
+    store.start()
+    recorder = get_event_recorder()
+    recorder.start()
+    await get_campaign_scheduler().resume()
+    yield
+    await get_campaign_scheduler().stop()
+    await store.stop()
+    await recorder.stop()
+    if inline:
+        await accounts.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -24,16 +83,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Choose your provider: "openai" or "gemini"
-# PROVIDER = "openai"  
-PROVIDER = "gemini" 
-
 # --- Setup API keys ---
+# Keys are read by the providers in llm_gateway. Provider order and models
+# come from LLM_PROVIDERS and LLM_MODEL_<PROVIDER> (see llm_router).
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-openai.api_key = OPENAI_API_KEY
-genai.configure(api_key=GEMINI_API_KEY)
 
 ######## --- Campaign Context Generation Logic --- #######
 # Input schema (matches your frontend payload)
@@ -41,6 +94,15 @@ class CampaignInput(BaseModel):
     initialMessage: str
     qaPairs: List[dict]
 
+# Identical payloads are answered from cache. Set CONTEXT_CACHE_DB to a SQLite
+# path to share cached answers between uvicorn workers.
+CONTEXT_CACHE_DB = os.getenv("CONTEXT_CACHE_DB")
+context_cache = ResponseCache(
+    max_entries=int(os.getenv("CONTEXT_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600")),
+    backend=SQLiteCacheBackend(CONTEXT_CACHE_DB) if CONTEXT_CACHE_DB else None,
+)
+
 @app.post("/api/campaign-context")
 async def generate_campaign_context(data: CampaignInput):
     # Combine the input into one string
@@ -60,89 +122,214 @@ async def generate_campaign_context(data: CampaignInput):
     """
 
     try:
-        if PROVIDER == "openai":
-            # OpenAI GPT call
-            response = openai.chat.completions.create(
-                model="gpt-4o-mini",  # or "gpt-4o", "gpt-3.5-turbo"
-                messages=[
-                    {"role": "system", "content": "You are a helpful marketing strategist."},
-                    {"role": "user", "content": prompt},
-                ],
+        # Routed across providers with failover and hedging, deduplicated by the cache
+        router = get_llm_router()
+        # A different provider order or model override must not be served an old answer
+        models = ",".join(f"{name}={router.models.get(name, 'default')}" for name in router.providers)
+        cache_key = make_cache_key(data.model_dump(), ",".join(router.providers), models)
+        final_context = await context_cache.get_or_compute(
+            cache_key,
+            lambda: router.generate(
+                prompt,
+                system="You are a helpful marketing strategist.",
                 max_tokens=300,
+                kind="campaign_context",
             )
-            final_context = response.choices[0].message.content.strip()
-
-        elif PROVIDER == "gemini":
-            # Gemini call
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-            final_context = response.text.strip()
-        # if PROVIDER:
-        #     final_context = "No context generated. Please check the input data."
-        else:
-            final_context = "Error: Unknown provider selected."
+        )
 
     except Exception as e:
         final_context = f"Error while generating context: {str(e)}"
 
     return {"finalContext": final_context}
 
+@app.get("/api/campaign-context/cache-stats")
+async def campaign_context_cache_stats():
+    return context_cache.stats()
+
+@app.get("/api/llm/health")
+async def llm_health():
+    return get_llm_router().stats()
+
 ########## --- Campaign Launch Logic --- ##########
 # Input schema (matches your frontend payload)
 class LaunchCampaignInput(BaseModel):
     summary: str
 
-# Simple matching logic 
+# Lead matching runs against an in-process index that is built once and then
+# refreshed incrementally, instead of scanning the whole table on every launch
+# "keyword" matches domain/role terms in the summary; "semantic" ranks leads
+# by embedding similarity and keeps the best LEAD_MATCH_TOP_K
+LEAD_MATCH_MODE = os.getenv("LEAD_MATCH_MODE", "keyword")
+LEAD_MATCH_TOP_K = int(os.getenv("LEAD_MATCH_TOP_K", "100"))
+LEAD_MATCH_MIN_SCORE = float(os.getenv("LEAD_MATCH_MIN_SCORE", "0.1"))
+
+_lead_index = None
+_semantic_index = None
+
+def get_lead_index():
+    """The index for LEAD_MATCH_MODE, built on first use."""
+    global _lead_index, _semantic_index
+    if LEAD_MATCH_MODE == "semantic":
+        if _semantic_index is None:
+            # numpy is only needed for semantic matching
+            from semantic_index import SemanticLeadIndex
+            _semantic_index = SemanticLeadIndex(get_supabase())
+        return _semantic_index
+    if _lead_index is None:
+        _lead_index = LeadIndex(get_supabase())
+    return _lead_index
+
+def iter_matched_pages(summary: str):
+    # Matching happens now; full rows are fetched lazily, a page at a time, for the matches only
+    if LEAD_MATCH_MODE == "semantic":
+        semantic_index = get_lead_index()
+        semantic_index.refresh()
+        with LEAD_MATCH_LATENCY.labels(mode="semantic").time():
+            ranked = semantic_index.top_k(summary, LEAD_MATCH_TOP_K, LEAD_MATCH_MIN_SCORE)
+        return semantic_index.reader.iter_pages_by_ids([lead_id for lead_id, _ in ranked])
+    # Match users whose domain or role appears in the summary
+    lead_index = get_lead_index()
+    lead_index.refresh()
+    with LEAD_MATCH_LATENCY.labels(mode="keyword").time():
+        lead_ids = lead_index.match_ids(summary)
+    return lead_index.reader.iter_pages_by_ids(lead_ids)
+
+def iter_matched_users(summary: str):
+    return itertools.chain.from_iterable(iter_matched_pages(summary))
+
 def match_users_with_summary(summary: str) -> list[dict]:
-    # Example: match users by domain, role, or keywords in summary
-    # You should adjust this logic to your schema and matching strategy
-    # For demo, we fetch all users and filter by keyword in summary
-    response = supabase.table("PotentialLeads").select("*").execute()
-    # print(f"Supabase response: {response.data}")
-    users = response.data if hasattr(response, 'data') else response
-    matched = []
-    summary_lower = summary.lower()
-    for user in users:
-        # Example: match if any keyword in summary is in user's domain or role
-        domain = user.get("domain", "").lower()
-        role = user.get("role", "").lower()
-
-        if domain and domain in summary_lower:
-            matched.append(user)
-        elif role and role in summary_lower:
-            matched.append(user)
-    return matched
+    return list(iter_matched_users(summary))
+
+# Format a matched user as a campaign entry for the frontend
+def format_campaign(user: dict) -> dict:
+    return {
+        "id": str(user.get("id", "")),
+        "target": {
+            "username": user.get("username", ""),
+            "avatar": user.get("avatar", "U"),
+            "domain": user.get("domain", ""),
+            "role": user.get("role", ""),
+            "tg_id": user.get("tg_id", ""),
+            "per_desc": user.get("person_description", ""),
+        },
+        "status": "contacting",
+        "lastInteraction": "just now"
+    }
 
 @app.post("/api/launch-campaign")
 async def launch_campaign(data: LaunchCampaignInput):
     summary = data.summary
-    matched_users = match_users_with_summary(summary)
+    # Refreshing the index and fetching rows are blocking Supabase calls
+    matched_users = await asyncio.to_thread(match_users_with_summary, summary)
     # You can format the campaigns as needed for frontend
-    campaigns = [
-        {
-            "id": str(user.get("id", "")),
-            "target": {
-                "username": user.get("username", ""),
-                "avatar": user.get("avatar", "U"),
-                "domain": user.get("domain", ""),
-                "role": user.get("role", ""),
-                "tg_id": user.get("tg_id", ""),
-                "per_desc": user.get("person_description", ""),
-            },
-            "status": "contacting",
-            "lastInteraction": "just now"
-        }
-        for user in matched_users
-    ]
-
-        # Call run_telegram_agent for each matched user (fire and forget)
-    for user in matched_users:
-        tg_id = user.get("tg_id", "")
-        if tg_id:
-            product_summary = data.summary
-            target_description = user.get("person_description", "")
-            # asyncio.create_task(run_telegram_agent(product_summary, target_description, tg_id))
-            run_telegram_agent(product_summary, target_description, tg_id)
-        break
-
-    return {"campaigns": campaigns}
\ No newline at end of file
+    campaigns = [format_campaign(user) for user in matched_users]
+
+    # Hand every matched user to the scheduler, which paces the sends per account
+    campaign_id = get_campaign_scheduler().submit(summary, matched_users)
+
+    return {"campaignId": campaign_id, "campaigns": campaigns}
+
+@app.post("/api/launch-campaign/stream")
+async def launch_campaign_stream(data: LaunchCampaignInput):
+    """Stream campaigns as NDJSON as soon as they are matched.
+
+    Lines are {"type": "started", "campaignId"}, then one {"type": "campaign",
+    "campaign"} per matched user, then {"type": "done", "count"}. Status
+    changes follow on /api/campaigns/{campaignId}/events.
+    """
+    summary = data.summary
+    scheduler = get_campaign_scheduler()
+    campaign_id = uuid.uuid4().hex
+
+    async def stream():
+        yield json.dumps({"type": "started", "campaignId": campaign_id}) + "\n"
+        count = 0
+        chunk = []
+        # Matching and each page fetch block on Supabase, so they run in worker threads
+        pages = await asyncio.to_thread(iter_matched_pages, summary)
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                break
+            for user in page:
+                yield json.dumps({"type": "campaign", "campaign": format_campaign(user)}) + "\n"
+                count += 1
+                # Start outreach a chunk at a time rather than after the whole match
+                chunk.append(user)
+                if len(chunk) >= scheduler.batch_size:
+                    scheduler.submit(summary, chunk, campaign_id)
+                    chunk = []
+        if chunk:
+            scheduler.submit(summary, chunk, campaign_id)
+        yield json.dumps({"type": "done", "count": count}) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.get("/api/campaigns/{campaign_id}/events")
+async def campaign_events(campaign_id: str):
+    """Server-Sent Events with each conversation's status transitions
+    (sent, replied, agreed, disagreed, timed_out, failed)."""
+    if OUTREACH_MODE == "queue":
+        # The outreach workers publish in their own processes; follow their event log instead
+        events = sse_events(get_event_recorder().follow(campaign_id))
+    else:
+        events = sse_stream(get_event_bus(), campaign_id)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/campaigns/{campaign_id}/status")
+async def campaign_status(campaign_id: str):
+    """Conversation counts by latest status and event counts (sent, replied,
+    agreed, ...) for a campaign, served from the recorder's in-memory aggregate."""
+    return await get_event_recorder().campaign_status(campaign_id)
+
+########## --- Metrics --- ##########
+# Queue depths are read when /metrics is scraped (the job queue's just before)
+metrics.CallbackGauge("campaign_queue_depth", "Conversations (or jobs, in queue mode) waiting to start",
+                      fn=lambda: get_campaign_scheduler().pending())
+metrics.CallbackGauge("conversation_store_pending_writes", "Buffered conversation store writes",
+                      fn=lambda: get_conversation_store().pending_writes())
+metrics.CallbackGauge("event_recorder_pending_writes", "Buffered interaction events",
+                      fn=lambda: get_event_recorder().pending_writes())
+def account_gauge(read):
+    """Per-account gauge values; none in queue mode, where the workers run the accounts."""
+    def values():
+        if OUTREACH_MODE == "queue":
+            return {}
+        from account_pool import get_account_pool
+        return {(a.name,): read(a) for a in get_account_pool().accounts.values()}
+    return values
+
+metrics.CallbackGauge("dispatcher_routed_conversations", "Conversations with a reply queue registered",
+                      ("account",), fn=account_gauge(lambda a: len(a.manager.dispatcher)))
+metrics.CallbackGauge("dispatcher_queued_replies", "Replies received but not yet handled",
+                      ("account",), fn=account_gauge(lambda a: a.manager.dispatcher.queued()))
+metrics.CallbackGauge("telegram_account_send_budget", "Sends an account could make right now",
+                      ("account",), fn=account_gauge(lambda a: a.rate_limiter.available()))
+metrics.CallbackGauge("telegram_account_conversations", "Active conversations assigned to an account",
+                      ("account",), fn=account_gauge(lambda a: len(a.conversations)))
+
+@app.get("/api/accounts")
+async def telegram_accounts():
+    from account_pool import get_account_pool
+    return get_account_pool().stats()
+
+@app.get("/api/jobs")
+async def job_queue_stats():
+    """Outreach jobs by state (queue mode)."""
+    return await asyncio.to_thread(get_job_queue().stats)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    # The job queue is read here, off the loop, so the gauges below stay non-blocking
+    await get_campaign_scheduler().refresh_pending()
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
+
+@app.get("/api/conversations/{conversation_id}/trace")
+async def conversation_trace(conversation_id: str):
+    """Timed spans of one conversation (recorded when TRACE_CONVERSATIONS=1)."""
+    return {"conversationId": conversation_id, "spans": metrics.tracer.get(conversation_id)}
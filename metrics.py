@@ -0,0 +1,130 @@
+import os
+import time
+import logging
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, List, Optional, Sequence, Tuple
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Per-conversation trace spans are kept in memory when TRACE_CONVERSATIONS=1
+TRACE_CONVERSATIONS = os.getenv("TRACE_CONVERSATIONS", "0") == "1"
+TRACE_RETAINED = int(os.getenv("TRACE_RETAINED_CONVERSATIONS", "1000"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "200"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+FLOOD_WAIT_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 3600, 86400)
+
+
+class CallbackGauge:
+    """Gauge read from `fn` when the registry is scraped.
+
+    `fn` returns a number, or a dict mapping label-value tuples to numbers.
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), fn: Optional[Callable[[], object]] = None,
+                 registry: CollectorRegistry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = list(labels)
+        self.fn = fn
+        registry.register(self)
+
+    def describe(self):
+        # Describing without reading `fn` keeps registration free of side effects
+        return [GaugeMetricFamily(self.name, self.help, labels=self.labels)]
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.help, labels=self.labels)
+        try:
+            value = self.fn()
+        except Exception as e:
+            logger.warning(f"Gauge {self.name} failed to read: {e}")
+            return [family]
+        values = value if isinstance(value, dict) else {(): value}
+        for key, number in values.items():
+            family.add_metric([str(label) for label in key], number)
+        return [family]
+
+
+def render() -> Tuple[bytes, str]:
+    """The default registry in the Prometheus text format, with its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+# --- Hot-path metrics ---
+LLM_LATENCY = Histogram("llm_request_seconds", "LLM call latency", ("provider", "prompt"), buckets=DEFAULT_BUCKETS)
+LLM_ERRORS = Counter("llm_errors_total", "Failed LLM calls", ("provider", "prompt"))
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Hedged LLM requests sent to a second provider", ("prompt",))
+TELEGRAM_LATENCY = Histogram("telegram_request_seconds", "Telegram API call latency", ("method",), buckets=DEFAULT_BUCKETS)
+FLOOD_WAIT_SECONDS = Histogram("telegram_flood_wait_seconds", "FloodWait durations imposed by Telegram",
+                               ("method",), buckets=FLOOD_WAIT_BUCKETS)
+PEER_FLOODS = Counter("telegram_peer_flood_total", "PeerFloodError responses")
+PEER_CACHE_LOOKUPS = Counter("peer_cache_lookups_total", "Username lookups by peer cache result", ("result",))
+LEAD_FETCH_LATENCY = Histogram("lead_fetch_seconds", "Supabase lead query latency", ("query",), buckets=DEFAULT_BUCKETS)
+LEAD_MATCH_LATENCY = Histogram("lead_match_seconds", "Time to match leads against a summary", ("mode",), buckets=DEFAULT_BUCKETS)
+ACTIVE_CONVERSATIONS = Gauge("active_conversations", "Conversations currently being driven")
+
+
+# --- Per-conversation tracing ---
+_conversation: contextvars.ContextVar = contextvars.ContextVar("conversation_id", default=None)
+
+
+class Tracer:
+    """Timed spans per conversation, kept for the most recent conversations."""
+
+    def __init__(self, retained: int = TRACE_RETAINED, max_spans: int = TRACE_MAX_SPANS):
+        self.retained = retained
+        self.max_spans = max_spans
+        self._spans: "OrderedDict[str, List[dict]]" = OrderedDict()
+
+    def record(self, conversation_id: str, span: dict):
+        spans = self._spans.setdefault(conversation_id, [])
+        self._spans.move_to_end(conversation_id)
+        if len(spans) < self.max_spans:
+            spans.append(span)
+        while len(self._spans) > self.retained:
+            self._spans.popitem(last=False)
+
+    def get(self, conversation_id: str) -> List[dict]:
+        return list(self._spans.get(conversation_id, []))
+
+
+tracer = Tracer()
+
+
+@contextmanager
+def trace_conversation(conversation_id: str):
+    """Attribute spans opened in the enclosed block (and tasks it creates) to a conversation."""
+    token = _conversation.set(conversation_id)
+    try:
+        yield
+    finally:
+        _conversation.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Record a timed span on the current conversation's trace, if tracing is on."""
+    conversation_id = _conversation.get()
+    if not TRACE_CONVERSATIONS or conversation_id is None:
+        yield
+        return
+    started_at = time.time()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        record = {"name": name, "startedAt": started_at, "durationMs": round((time.perf_counter() - start) * 1000, 2)}
+        if attributes:
+            record["attributes"] = attributes
+        if error:
+            record["error"] = error
+        tracer.record(conversation_id, record)
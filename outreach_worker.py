@@ -0,0 +1,265 @@
+"""Outreach worker processes fed by the job queue.
+
+Run alongside the API with OUTREACH_MODE=queue, which makes
+/api/launch-campaign enqueue jobs instead of messaging from the API process:
+
+    python outreach_worker.py --processes 2
+
+Each process owns a disjoint share of the Telegram accounts (a session can't
+be shared between processes), so more processes than accounts is pointless.
+A process leases jobs for its own accounts or for none, drives their
+conversations, extends the leases while it works and completes each job once
+its conversations are finished and flushed. A process that dies leaves its
+leases to expire, and the jobs are delivered again; conversations resume from
+their stored state. SIGTERM or SIGINT stops leasing, lets running jobs finish
+for up to OUTREACH_WORKER_SHUTDOWN_SECONDS and hands the rest back to the queue.
+"""
+import os
+import signal
+import socket
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from typing import Dict, List, Optional
+import tg_agent
+from account_pool import AccountPool, get_account_pool, shard_account_pool
+from campaign_scheduler import CAMPAIGN_MAX_CONCURRENCY, CONVERSATIONS_JOB, CampaignScheduler, ConversationSlot
+from conversation_store import ACTIVE_STATES, PENDING, get_conversation_store
+from event_recorder import get_event_recorder
+from job_queue import JOB_LEASE_SECONDS, JobQueue, get_job_queue
+
+logger = logging.getLogger(__name__)
+
+OUTREACH_WORKER_PROCESSES = int(os.getenv("OUTREACH_WORKER_PROCESSES", "1"))
+# How often an idle process polls the queue
+OUTREACH_WORKER_POLL_SECONDS = float(os.getenv("OUTREACH_WORKER_POLL_SECONDS", "1.0"))
+OUTREACH_WORKER_SHUTDOWN_SECONDS = float(os.getenv("OUTREACH_WORKER_SHUTDOWN_SECONDS", "30"))
+
+
+class OutreachWorker:
+    """Runs conversation jobs from the queue on one process's Telegram accounts.
+
+    Args:
+        worker_id: Lease owner recorded on the jobs
+        accounts: The accounts this process owns
+        all_accounts: Names of every configured account, to tell which
+            conversations belong to another process
+        queue: Job queue to lease from
+        store: Conversation store shared with the API
+        max_concurrency: Conversations working (not parked on a reply) at
+            once (defaults to CAMPAIGN_MAX_CONCURRENCY per owned account)
+    """
+
+    def __init__(self, worker_id: str, accounts: AccountPool, all_accounts: Optional[List[str]] = None,
+                 queue: Optional[JobQueue] = None, store=None, max_concurrency: Optional[int] = None,
+                 lease_seconds: float = JOB_LEASE_SECONDS, poll_interval: float = OUTREACH_WORKER_POLL_SECONDS,
+                 shutdown_timeout: float = OUTREACH_WORKER_SHUTDOWN_SECONDS):
+        self.worker_id = worker_id
+        self.accounts = accounts
+        self.all_accounts = set(all_accounts or accounts.accounts)
+        self.queue = queue if queue is not None else get_job_queue()
+        self.store = store if store is not None else get_conversation_store()
+        self.max_concurrency = max_concurrency or CAMPAIGN_MAX_CONCURRENCY * len(accounts.accounts)
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        # Only used for its batched account assignment, peer cache warming and intros
+        self.scheduler = CampaignScheduler(store=self.store, accounts=accounts)
+        self.slots = asyncio.Semaphore(self.max_concurrency)
+        # Conversations of each running job that haven't got a slot yet
+        self._unstarted: Dict[int, int] = {}
+        self._jobs: Dict[asyncio.Task, dict] = {}
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        """Stop leasing new jobs; `run` returns once running jobs are done or handed back."""
+        if not self._stopping.is_set():
+            logger.info(f"Worker {self.worker_id} shutting down")
+        self._stopping.set()
+
+    async def run(self):
+        """Lease and run jobs until `stop` is called."""
+        partitions = list(self.accounts.accounts)
+        while not self._stopping.is_set():
+            jobs = []
+            # Parked conversations hold no slot, so more jobs are leased while they wait
+            if not self.slots.locked() and sum(self._unstarted.values()) < self.max_concurrency:
+                try:
+                    jobs = await asyncio.to_thread(
+                        self.queue.lease, self.worker_id, 1, self.lease_seconds, partitions
+                    )
+                except Exception as e:
+                    logger.error(f"Leasing jobs failed: {e}")
+            for job in jobs:
+                self._unstarted[job["id"]] = len(job["payload"].get("conversation_ids", []))
+                task = asyncio.get_event_loop().create_task(self._process(job))
+                self._jobs[task] = job
+                task.add_done_callback(self._jobs.pop)
+            if not jobs:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        await self._drain()
+
+    async def _drain(self):
+        tasks = list(self._jobs)
+        if not tasks:
+            return
+        logger.info(f"Waiting up to {self.shutdown_timeout}s for {len(tasks)} running jobs")
+        _, unfinished = await asyncio.wait(tasks, timeout=self.shutdown_timeout)
+        jobs = [self._jobs[task] for task in unfinished]
+        for task in unfinished:
+            task.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        # Conversations keep their state, so the next worker resumes them where they stopped
+        for job in jobs:
+            await asyncio.to_thread(self.queue.release, job["id"], self.worker_id)
+        if jobs:
+            logger.info(f"Handed {len(jobs)} unfinished jobs back to the queue")
+
+    async def _heartbeat(self, job: dict, task: asyncio.Task):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            held = await asyncio.to_thread(self.queue.extend, job["id"], self.worker_id, self.lease_seconds)
+            if not held:
+                # The lease expired before it was renewed and the job may already be
+                # redelivered; stop driving its conversations so leads aren't messaged twice
+                logger.warning(f"Worker {self.worker_id} lost the lease on job {job['id']}, abandoning it")
+                task.cancel()
+                return
+
+    async def _process(self, job: dict):
+        heartbeat = asyncio.get_event_loop().create_task(self._heartbeat(job, asyncio.current_task()))
+        try:
+            if job["kind"] != CONVERSATIONS_JOB:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            await self._run_conversations(job)
+            # Final states must be durable before the job stops being redelivered
+            await self.store.flush()
+            await asyncio.to_thread(self.queue.complete, job["id"], self.worker_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed (attempt {job['attempts']}): {e}")
+            await asyncio.to_thread(self.queue.fail, job["id"], self.worker_id, str(e))
+        finally:
+            heartbeat.cancel()
+            self._unstarted.pop(job["id"], None)
+
+    async def _run_conversations(self, job: dict):
+        payload = job["payload"]
+        conversations = await asyncio.gather(*(self.store.get(i) for i in payload["conversation_ids"]))
+        # A redelivered job skips what already finished
+        conversations = [c for c in conversations if c is not None and c["state"] in ACTIVE_STATES]
+        mine, foreign = [], {}
+        for conversation in conversations:
+            account = conversation.get("account")
+            if account in self.all_accounts and self.accounts.get(account) is None:
+                foreign.setdefault(account, []).append(conversation["id"])
+            else:
+                mine.append(conversation)
+        # Replies to these arrive on an account another process owns
+        for account, conversation_ids in foreign.items():
+            await asyncio.to_thread(
+                self.queue.enqueue, CONVERSATIONS_JOB,
+                {"campaign_id": payload.get("campaign_id"), "conversation_ids": conversation_ids}, account
+            )
+        self._unstarted[job["id"]] = len(mine)
+        fresh = [c for c in mine if c["state"] == PENDING and not c.get("intro")]
+        if fresh:
+            await self.scheduler.prepare_batch(fresh)
+        states = await asyncio.gather(*(self._run_conversation(job, conversation) for conversation in mine))
+        unfinished = sum(1 for state in states if state is None or state in ACTIVE_STATES)
+        if unfinished:
+            # E.g. the account is rate limited for a long time; the retry resumes them
+            await self.store.flush()
+            raise RuntimeError(f"{unfinished} conversations stopped before finishing")
+
+    async def _run_conversation(self, job: dict, conversation: dict) -> Optional[str]:
+        slot = ConversationSlot(self.slots)
+        await slot.acquire()
+        self._unstarted[job["id"]] -= 1
+        try:
+            return await tg_agent.run_conversation(conversation, slot)
+        except Exception as e:
+            logger.error(f"Campaign {conversation['campaign_id']}: conversation with {conversation['username']} failed: {e}")
+            return None
+        finally:
+            slot.release()
+
+
+async def serve(index: int = 0, count: int = 1):
+    """Run worker process `index` of `count` until SIGTERM or SIGINT."""
+    all_accounts = list(get_account_pool().accounts)
+    accounts = shard_account_pool(index, count) if count > 1 else get_account_pool()
+    worker = OutreachWorker(f"{socket.gethostname()}:{os.getpid()}", accounts, all_accounts)
+    loop = asyncio.get_event_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, worker.stop)
+    store = worker.store
+    store.start()
+    recorder = get_event_recorder()
+    recorder.start()
+    await accounts.start()
+    logger.info(f"Outreach worker {worker.worker_id} running accounts {', '.join(accounts.accounts)}")
+    try:
+        await worker.run()
+    finally:
+        await store.stop()
+        await recorder.stop()
+        await accounts.stop()
+
+
+def run_process(index: int, count: int):
+    asyncio.run(serve(index, count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run outreach workers that consume campaign jobs")
+    parser.add_argument("--processes", type=int, default=OUTREACH_WORKER_PROCESSES,
+                        help="Worker processes; each owns a share of the Telegram accounts")
+    args = parser.parse_args()
+
+    accounts = len(get_account_pool().accounts)
+    count = max(1, min(args.processes, accounts))
+    if count < args.processes:
+        logger.warning(f"Only {accounts} Telegram accounts configured, running {count} worker processes")
+    if count == 1:
+        run_process(0, 1)
+        return
+
+    # Sessions and SQLite connections must not be inherited, so children start fresh
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=run_process, args=(i, count), name=f"outreach-worker-{i}") for i in range(count)]
+    for process in processes:
+        process.start()
+
+    stopping = False
+
+    def forward(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    while not stopping:
+        for i, process in enumerate(processes):
+            process.join(timeout=1)
+            # Its leases expire and the jobs are redelivered; restart the process for its accounts
+            if not stopping and process.exitcode not in (None, 0):
+                logger.error(f"{process.name} exited with {process.exitcode}, restarting")
+                processes[i] = context.Process(target=run_process, args=(i, count), name=process.name)
+                processes[i].start()
+        if all(process.exitcode == 0 for process in processes):
+            break
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
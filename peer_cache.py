@@ -0,0 +1,102 @@
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+PEER_CACHE_DB = os.getenv("PEER_CACHE_DB", "peer_cache.db")
+# Resolved peers stay valid for a long time; failed lookups are retried sooner
+PEER_CACHE_TTL_SECONDS = float(os.getenv("PEER_CACHE_TTL_SECONDS", str(30 * 86400)))
+PEER_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("PEER_CACHE_NEGATIVE_TTL_SECONDS", "86400"))
+
+
+class CachedPeer(NamedTuple):
+    """A cached username lookup. user_id is None for a negative entry."""
+    user_id: Optional[int]
+    access_hash: Optional[int]
+    expires_at: float
+
+    @property
+    def found(self) -> bool:
+        return self.user_id is not None
+
+
+class PeerCache:
+    """Persistent username -> (user id, access_hash) cache for one Telegram account.
+
+    Access hashes are only valid for the account that resolved them, so every
+    entry is keyed by account as well as username. Lookups are served from
+    memory; the SQLite file keeps entries across restarts.
+    """
+
+    def __init__(self, account: str, path: str = PEER_CACHE_DB):
+        self.account = account
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS peers ("
+            "account TEXT NOT NULL, username TEXT NOT NULL, user_id INTEGER, access_hash INTEGER, "
+            "expires_at REAL NOT NULL, PRIMARY KEY (account, username))"
+        )
+        self._conn.commit()
+        self._entries: Dict[str, CachedPeer] = {}
+        now = time.time()
+        for username, user_id, access_hash, expires_at in self._conn.execute(
+            "SELECT username, user_id, access_hash, expires_at FROM peers WHERE account = ? AND expires_at > ?",
+            (account, now)
+        ):
+            self._entries[username] = CachedPeer(user_id, access_hash, expires_at)
+        logger.info(f"Loaded {len(self._entries)} cached peers for {account}")
+
+    @staticmethod
+    def _key(username: str) -> str:
+        return username.lstrip('@').lower()
+
+    def get(self, username: str) -> Optional[CachedPeer]:
+        """Return the cached entry (positive or negative), or None on a miss."""
+        key = self._key(username)
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.time():
+            self._entries.pop(key, None)
+            return None
+        return entry
+
+    def _store(self, username: str, entry: CachedPeer):
+        key = self._key(username)
+        self._entries[key] = entry
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO peers (account, username, user_id, access_hash, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (self.account, key, entry.user_id, entry.access_hash, entry.expires_at)
+            )
+            self._conn.commit()
+
+    def put(self, username: str, user_id: int, access_hash: int):
+        self._store(username, CachedPeer(user_id, access_hash, time.time() + PEER_CACHE_TTL_SECONDS))
+
+    def put_negative(self, username: str):
+        self._store(username, CachedPeer(None, None, time.time() + PEER_CACHE_NEGATIVE_TTL_SECONDS))
+
+    def invalidate(self, username: str):
+        key = self._key(username)
+        self._entries.pop(key, None)
+        with self._lock:
+            self._conn.execute("DELETE FROM peers WHERE account = ? AND username = ?", (self.account, key))
+            self._conn.commit()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_caches: Dict[str, PeerCache] = {}
+
+
+def get_peer_cache(account: str) -> PeerCache:
+    """Return the peer cache for a Telegram account (keyed by session name)."""
+    if account not in _caches:
+        _caches[account] = PeerCache(account)
+    return _caches[account]
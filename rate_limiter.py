@@ -0,0 +1,85 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+# Sustained sends per minute and burst size allowed for one Telegram account
+TG_SENDS_PER_MINUTE = float(os.getenv("TG_SENDS_PER_MINUTE", "20"))
+TG_SEND_BURST = float(os.getenv("TG_SEND_BURST", "5"))
+
+
+class TokenBucket:
+    """Async token bucket that also honours penalties reported by Telegram.
+
+    Tokens refill continuously at `rate` per second up to `capacity`. When
+    Telegram answers with a FloodWait, `penalize` empties the bucket and blocks
+    every acquirer until the wait has elapsed.
+    """
+
+    def __init__(self, rate_per_minute: float = TG_SENDS_PER_MINUTE, capacity: float = TG_SEND_BURST):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity
+        self.tokens = capacity
+        self.blocked_until = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        start = max(self._updated, self.blocked_until)
+        if now > start:
+            self.tokens = min(self.capacity, self.tokens + (now - start) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Wait until a send is allowed and consume one token."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def penalize(self, seconds: float):
+        """Block the bucket for `seconds` (e.g. FloodWaitError.seconds) and drain it."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+        self._updated = now
+        logger.warning(f"Rate limiter paused for {seconds}s")
+
+    async def wait_unblocked(self):
+        """Wait out the current penalty without consuming a token."""
+        while True:
+            now = time.monotonic()
+            if now >= self.blocked_until:
+                return
+            await asyncio.sleep(self.blocked_until - now)
+
+    def is_blocked(self) -> bool:
+        return time.monotonic() < self.blocked_until
+
+    def available(self) -> float:
+        """Tokens that could be spent right now (0 while blocked)."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return 0.0
+        start = max(self._updated, self.blocked_until)
+        return min(self.capacity, self.tokens + max(0.0, now - start) * self.rate)
+
+
+_limiters: Dict[str, TokenBucket] = {}
+
+
+def get_rate_limiter(account: str) -> TokenBucket:
+    """Return the token bucket for a Telegram account (keyed by session name)."""
+    if account not in _limiters:
+        _limiters[account] = TokenBucket()
+    return _limiters[account]
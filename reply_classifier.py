@@ -0,0 +1,49 @@
+import re
+from typing import Optional
+
+# Only replies that are nothing but a clear yes or no are settled locally; a
+# keyword inside a longer message ("no worries, let's talk tomorrow", "I'll
+# pass this to my cofounder") says little, so those go to the LLM
+AGREE_REPLIES = [
+    r"yes( please)?", r"yeah", r"yep", r"sure( thing)?", r"absolutely", r"definitely",
+    r"sounds (good|great)", r"let'?s do it", r"count me in", r"i'?m in",
+    r"(ok(ay)?,? )?(yes,? )?happy to (chat|talk|meet)",
+]
+DISAGREE_REPLIES = [
+    r"no", r"nope", r"nah", r"no,? thanks?( you)?", r"not interested", r"(no,? )?i'?m not interested",
+    r"unsubscribe", r"leave me alone", r"(please )?(don'?t|do not) (contact|message|text) me( again)?",
+    r"not for me", r"not a fit", r"no,? not interested",
+]
+
+_AGREE = re.compile("(" + "|".join(AGREE_REPLIES) + ")")
+_DISAGREE = re.compile("(" + "|".join(DISAGREE_REPLIES) + ")")
+# Punctuation and emoji around the words don't change the answer
+_NOISE = re.compile(r"[^a-z' ,]+")
+
+# Closing messages sent when the classifier ends the conversation on its own
+CLOSING_MESSAGES = {
+    "AGREED": "That's great, thank you! I'll let the founder know and they'll reach out shortly to set up a quick chat.",
+    "DISAGREED": "No problem at all, thanks for taking the time to reply. Have a great day!",
+}
+
+
+def classify_reply(text: str) -> Optional[str]:
+    """
+    Decide obvious yes/no replies without calling the LLM.
+
+    Args:
+        text: The target's latest message
+
+    Returns:
+        'AGREED' or 'DISAGREED' when the whole reply is a plain yes or no,
+        None when the LLM should decide
+    """
+    if not text or "?" in text:
+        return None
+    normalized = _NOISE.sub(" ", text.lower().replace("’", "'"))
+    normalized = " ".join(normalized.split()).strip(" ,")
+    if _AGREE.fullmatch(normalized):
+        return "AGREED"
+    if _DISAGREE.fullmatch(normalized):
+        return "DISAGREED"
+    return None
@@ -0,0 +1,179 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _canonical(value):
+    """Strip surrounding whitespace from every string so cosmetic edits still hit."""
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+def make_cache_key(payload, provider: str, model: str) -> str:
+    """Hash a request payload together with the provider and model that answer it."""
+    canonical = json.dumps(
+        {"payload": _canonical(payload), "provider": provider, "model": model},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class SQLiteCacheBackend:
+    """Cache backend in a SQLite file, shared by every worker process on the host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute(
+            "SELECT value FROM response_cache WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: float):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl)
+        )
+        # Opportunistically drop expired rows so the file doesn't grow forever
+        conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+        conn.commit()
+
+
+class ResponseCache:
+    """Size-bounded LRU cache with a TTL and single-flight computation.
+
+    Concurrent requests for the same key share one computation, which runs
+    in its own task so it outlives any single caller. Failed computations
+    are not cached. An optional backend (e.g. SQLiteCacheBackend)
+    is consulted on local misses and written on every fill, so several uvicorn
+    workers can share hits.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _get_local(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _set_local(self, key: str, value: str):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _get_shared(self, key: str) -> Optional[str]:
+        if self.backend is None:
+            return None
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            return None
+
+    def _set_shared(self, key: str, value: str):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed: {e}")
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the cached value for key, computing it at most once if absent.
+
+        Args:
+            key: Cache key (see make_cache_key)
+            compute: Zero-argument coroutine function producing the value
+
+        Returns:
+            The cached or freshly computed value
+        """
+        value = self._get_local(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+        else:
+            # The fill runs in its own task, so a caller that is cancelled
+            # (e.g. a client disconnecting) doesn't cancel it for the others
+            inflight = asyncio.ensure_future(self._fill(key, compute))
+            self._inflight[key] = inflight
+            inflight.add_done_callback(lambda task: self._filled(key, task))
+        return await asyncio.shield(inflight)
+
+    async def _fill(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        # The backend does file I/O (thread-local SQLite connections), so keep it off the loop
+        value = await asyncio.to_thread(self._get_shared, key) if self.backend is not None else None
+        if value is not None:
+            self.shared_hits += 1
+        else:
+            self.misses += 1
+            value = await compute()
+            if self.backend is not None:
+                await asyncio.to_thread(self._set_shared, key, value)
+        self._set_local(key, value)
+        return value
+
+    def _filled(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark retrieved so an exception nobody awaited isn't logged
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "sharedHits": self.shared_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "size": len(self._entries),
+        }
@@ -0,0 +1,303 @@
+import os
+import re
+import math
+import time
+import zlib
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from lead_reader import LeadReader
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_DIM = int(os.getenv("SEMANTIC_DIM", "256"))
+SEMANTIC_REFRESH_SECONDS = float(os.getenv("SEMANTIC_REFRESH_SECONDS", "30"))
+SEMANTIC_FULL_REFRESH_SECONDS = float(os.getenv("SEMANTIC_FULL_REFRESH_SECONDS", "3600"))
+# Timestamp column set on every insert and update of a lead (e.g. "updated_at");
+# when set, refreshes also re-embed rows changed since the last one. Empty (the
+# default, PotentialLeads has no such column) picks up new ids only.
+SEMANTIC_UPDATED_COLUMN = os.getenv("SEMANTIC_UPDATED_COLUMN", "")
+# How often a refresh also scans the lead ids to drop deleted leads
+SEMANTIC_PRUNE_SECONDS = float(os.getenv("SEMANTIC_PRUNE_SECONDS", "600"))
+
+# Lead columns that describe a lead for semantic matching
+SEMANTIC_COLUMNS = ("id", "domain", "role", "person_description")
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def lead_text(row: dict) -> str:
+    """The text a lead is embedded from."""
+    return " ".join(str(row.get(field) or "") for field in ("role", "domain", "person_description"))
+
+
+class Embedder:
+    """Turns texts into L2-normalized float32 vectors of a fixed dimension."""
+
+    dim = 0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+    def observe(self, texts: List[str]):
+        """Called with every indexed document; embedders that learn corpus statistics override it."""
+
+    def fresh(self) -> "Embedder":
+        """An embedder for a full rebuild, without corpus statistics gathered so far."""
+        return self
+
+
+class HashingEmbedder(Embedder):
+    """Offline TF-IDF embedder using the hashing trick.
+
+    Unigrams and bigrams are hashed into `dim` signed buckets with sublinear
+    term frequency. Document frequencies are tracked as leads are indexed and
+    applied as IDF weights on the query side only, so stored lead vectors
+    never need recomputing when the corpus grows.
+    """
+
+    def __init__(self, dim: int = SEMANTIC_DIM):
+        self.dim = dim
+        self._df = np.zeros(dim, dtype=np.float64)
+        self._docs = 0
+
+    def _features(self, text: str) -> Counter:
+        tokens = _TOKEN.findall(text.lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return Counter(grams)
+
+    def _vector(self, features: Counter) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram, count in features.items():
+            h = zlib.crc32(gram.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            vector[h % self.dim] += sign * (1.0 + math.log(count))
+        return vector
+
+    def embed(self, texts):
+        matrix = np.vstack([self._vector(self._features(text)) for text in texts]) if texts else np.zeros((0, self.dim), np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def observe(self, texts):
+        for text in texts:
+            buckets = {zlib.crc32(gram.encode("utf-8")) % self.dim for gram in self._features(text)}
+            self._df[list(buckets)] += 1
+        self._docs += len(texts)
+
+    def fresh(self):
+        return HashingEmbedder(self.dim)
+
+    def embed_query(self, text):
+        vector = self._vector(self._features(text))
+        if self._docs:
+            # Terms no lead contains can't match anything; drop them so they
+            # don't dilute the scores of the terms that can
+            idf = np.log((1.0 + self._docs) / (1.0 + self._df)) + 1.0
+            vector *= np.where(self._df > 0, idf, 0.0).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class GeminiEmbedder(Embedder):
+    """Gemini text embeddings (needs network access and GEMINI_API_KEY)."""
+
+    def __init__(self, model: str = "models/text-embedding-004", dim: int = 768):
+        import google.generativeai as genai
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        self.genai = genai
+        self.model = model
+        self.dim = dim
+
+    def embed(self, texts):
+        if not texts:
+            return np.zeros((0, self.dim), np.float32)
+        result = self.genai.embed_content(model=self.model, content=texts)
+        matrix = np.asarray(result["embedding"], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+class SemanticLeadIndex:
+    """Lead vectors in one contiguous NumPy matrix, searched with a single matmul.
+
+    Rows are upserted incrementally (the matrix grows by doubling) and removed
+    by moving the last row into the gap, so the live vectors always occupy
+    `matrix[:size]`. A query is one matrix-vector product plus argpartition.
+    Refreshes embed rows past the highest indexed id, or, when
+    SEMANTIC_UPDATED_COLUMN is set, follow a (column, id) cursor so edited
+    leads are re-embedded too; every SEMANTIC_PRUNE_SECONDS they also sweep
+    the lead ids to drop deleted leads.
+    """
+
+    def __init__(self, client, embedder: Optional[Embedder] = None, capacity: int = 1024, table: str = "PotentialLeads"):
+        self.reader = LeadReader(client, table)
+        self.embedder = embedder or HashingEmbedder()
+        self._matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        self._ids: List[object] = []
+        self._row_of: Dict[object, int] = {}
+        self._lock = threading.Lock()
+        # Launches match in worker threads; only one of them refreshes at a time
+        self._refresh_lock = threading.Lock()
+        self._max_id = None
+        # (SEMANTIC_UPDATED_COLUMN, id) of the last change read
+        self._cursor: Tuple[Optional[str], object] = (None, None)
+        self._last_refresh = 0.0
+        self._last_full_refresh = 0.0
+        self._last_prune = 0.0
+        self._built = False
+
+    def _grow(self, needed: int):
+        capacity = self._matrix.shape[0]
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        matrix = np.zeros((capacity, self.embedder.dim), dtype=np.float32)
+        matrix[:len(self._ids)] = self._matrix[:len(self._ids)]
+        self._matrix = matrix
+
+    def upsert(self, rows: List[dict]):
+        """Insert or replace the vectors of the given lead rows."""
+        if not rows:
+            return
+        texts = [lead_text(row) for row in rows]
+        with self._lock:
+            new = [text for row, text in zip(rows, texts) if row.get("id") not in self._row_of]
+        # Corpus statistics count each lead once; edits are caught up by the next rebuild
+        self.embedder.observe(new)
+        vectors = self.embedder.embed(texts)
+        with self._lock:
+            self._grow(len(self._ids) + len(rows))
+            for row, vector in zip(rows, vectors):
+                lead_id = row.get("id")
+                index = self._row_of.get(lead_id)
+                if index is None:
+                    index = len(self._ids)
+                    self._ids.append(lead_id)
+                    self._row_of[lead_id] = index
+                self._matrix[index] = vector
+
+    def remove(self, lead_ids: Iterable):
+        """Drop leads from the index."""
+        with self._lock:
+            for lead_id in lead_ids:
+                index = self._row_of.pop(lead_id, None)
+                if index is None:
+                    continue
+                last = len(self._ids) - 1
+                if index != last:
+                    moved = self._ids[last]
+                    self._matrix[index] = self._matrix[last]
+                    self._ids[index] = moved
+                    self._row_of[moved] = index
+                self._ids.pop()
+
+    def _columns(self) -> Tuple[str, ...]:
+        return SEMANTIC_COLUMNS + ((SEMANTIC_UPDATED_COLUMN,) if SEMANTIC_UPDATED_COLUMN else ())
+
+    def _advance(self, page: List[dict]):
+        """Move the refresh cursors past a page of indexed rows."""
+        for row in page:
+            lead_id = row.get("id")
+            if self._max_id is None or lead_id > self._max_id:
+                self._max_id = lead_id
+            if SEMANTIC_UPDATED_COLUMN and row.get(SEMANTIC_UPDATED_COLUMN) is not None:
+                change = (row[SEMANTIC_UPDATED_COLUMN], lead_id)
+                if self._cursor[0] is None or change > self._cursor:
+                    self._cursor = change
+
+    def rebuild(self):
+        """Re-embed the whole lead table."""
+        # Built off to the side so queries keep using the old matrix meanwhile
+        staging = SemanticLeadIndex(self.reader.client, self.embedder.fresh(), capacity=max(1024, len(self._ids)),
+                                    table=self.reader.table)
+        for page in self.reader.iter_pages(self._columns()):
+            staging.upsert(page)
+            staging._advance(page)
+        with self._lock:
+            self.embedder = staging.embedder
+            self._matrix, self._ids, self._row_of = staging._matrix, staging._ids, staging._row_of
+            self._max_id, self._cursor = staging._max_id, staging._cursor
+            self._last_refresh = self._last_full_refresh = self._last_prune = time.monotonic()
+            self._built = True
+        logger.info(f"Semantic index rebuilt with {len(self._ids)} leads")
+
+    def prune(self) -> int:
+        """Drop leads that are no longer in the lead table; returns how many."""
+        with self._lock:
+            indexed = sorted(self._ids)
+        # Both sides are in id order, so one pass over the table's ids finds the gaps
+        gone = []
+        position = 0
+        for page in self.reader.iter_pages(("id",)):
+            for row in page:
+                lead_id = row.get("id")
+                while position < len(indexed) and indexed[position] < lead_id:
+                    gone.append(indexed[position])
+                    position += 1
+                if position < len(indexed) and indexed[position] == lead_id:
+                    position += 1
+        gone.extend(indexed[position:])
+        self.remove(gone)
+        self._last_prune = time.monotonic()
+        if gone:
+            logger.info(f"Semantic index dropped {len(gone)} deleted leads")
+        return len(gone)
+
+    def refresh(self, force: bool = False):
+        """Embed new and changed leads, or rebuild everything when the full-refresh interval has passed."""
+        with self._refresh_lock:
+            self._refresh(force)
+
+    def _refresh(self, force: bool):
+        now = time.monotonic()
+        if not self._built or now - self._last_full_refresh >= SEMANTIC_FULL_REFRESH_SECONDS:
+            self.rebuild()
+            return
+        if not force and now - self._last_refresh < SEMANTIC_REFRESH_SECONDS:
+            return
+        if SEMANTIC_UPDATED_COLUMN:
+            since, after_id = self._cursor
+            pages = self.reader.iter_pages_changed(self._columns(), SEMANTIC_UPDATED_COLUMN, since, after_id)
+        else:
+            pages = self.reader.iter_pages(SEMANTIC_COLUMNS, after_id=self._max_id)
+        for page in pages:
+            self.upsert(page)
+            self._advance(page)
+        if now - self._last_prune >= SEMANTIC_PRUNE_SECONDS:
+            self.prune()
+        self._last_refresh = now
+
+    def top_k(self, query: str, k: int = 50, min_score: float = 0.0) -> List[Tuple[object, float]]:
+        """
+        Rank leads by cosine similarity to the query.
+
+        Args:
+            query: Campaign summary
+            k: Maximum number of leads to return
+            min_score: Drop leads scoring below this
+
+        Returns:
+            List of (lead id, score), best first
+        """
+        vector = self.embedder.embed_query(query)
+        with self._lock:
+            size = len(self._ids)
+            if size == 0 or k <= 0:
+                return []
+            scores = self._matrix[:size] @ vector
+            k = min(k, size)
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [(self._ids[i], float(scores[i])) for i in best if scores[i] >= min_score]
+
+    def __len__(self):
+        return len(self._ids)
@@ -1,9 +1,25 @@
 import os
-from supabase import create_client, Client
 from dotenv import load_dotenv
 
 load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+_client = None
+
+
+def get_supabase():
+    """Return the process-wide Supabase client, created (and the SDK imported) on first use."""
+    global _client
+    if _client is None:
+        from supabase import create_client
+        _client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _client
+
+
+def __getattr__(name: str):
+    # Keeps `from supabase_client import supabase` working without creating
+    # the client at import time
+    if name == "supabase":
+        return get_supabase()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
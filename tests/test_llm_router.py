@@ -0,0 +1,90 @@
+"""LLM gateway and router behaviour, driven by local FakeProviders.
+
+Covers the gateway's retries with backoff and per-attempt deadline, and the
+router's failover, hedging and cooldown, without any network access.
+"""
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llm_gateway import FakeProvider, LLMError, LLMGateway
+from llm_router import LLM_FAILURE_THRESHOLD, LLMRouter
+
+BACKOFF = 0.02
+
+
+def make_gateway(*providers, timeout: float = 5.0, max_retries: int = 2) -> LLMGateway:
+    gateway = LLMGateway(timeout=timeout, max_retries=max_retries, backoff=BACKOFF)
+    for provider in providers:
+        gateway.register(provider)
+    return gateway
+
+
+def test_gateway_retries_with_backoff():
+    flaky = FakeProvider(reply="hello", failures=2, name="flaky")
+    gateway = make_gateway(flaky)
+    start = time.monotonic()
+    assert asyncio.run(gateway.generate("hi", provider="flaky")) == "hello"
+    assert flaky.calls == 3
+    # Two retries wait at least BACKOFF and then 2 * BACKOFF
+    assert time.monotonic() - start >= 3 * BACKOFF
+
+
+def test_gateway_gives_up_after_retries():
+    broken = FakeProvider(failures=10, name="broken")
+    gateway = make_gateway(broken, max_retries=1)
+    with pytest.raises(LLMError):
+        asyncio.run(gateway.generate("hi", provider="broken"))
+    assert broken.calls == 2
+
+
+def test_gateway_times_out_slow_attempts():
+    slow = FakeProvider(latency=5.0, name="slow")
+    gateway = make_gateway(slow, timeout=0.05, max_retries=0)
+    start = time.monotonic()
+    with pytest.raises(LLMError, match="timed out"):
+        asyncio.run(gateway.generate("hi", provider="slow"))
+    assert time.monotonic() - start < 1.0
+
+
+def test_router_fails_over_to_next_provider():
+    primary = FakeProvider(reply="primary", failures=1, name="primary")
+    backup = FakeProvider(reply="backup", name="backup")
+    router = LLMRouter(make_gateway(primary, backup), ["primary", "backup"], hedge=False)
+    assert asyncio.run(router.generate("hi")) == "backup"
+    # Failing over replaces retrying the same provider
+    assert primary.calls == 1
+    assert router.health["primary"].consecutive_failures == 1
+
+
+def test_router_hedge_beats_slow_provider():
+    slow = FakeProvider(reply="slow", latency=2.0, name="slow")
+    fast = FakeProvider(reply="fast", name="fast")
+    router = LLMRouter(make_gateway(slow, fast), ["slow", "fast"], hedge=True, hedge_delay=0.05)
+    start = time.monotonic()
+    assert asyncio.run(router.generate("hi")) == "fast"
+    assert time.monotonic() - start < 1.0
+    assert slow.calls == 1 and fast.calls == 1
+
+
+def test_router_cools_down_failing_provider():
+    primary = FakeProvider(reply="primary", failures=LLM_FAILURE_THRESHOLD, name="primary")
+    backup = FakeProvider(reply="backup", name="backup")
+    router = LLMRouter(make_gateway(primary, backup), ["primary", "backup"], hedge=False)
+
+    async def run():
+        for _ in range(LLM_FAILURE_THRESHOLD):
+            assert await router.generate("hi") == "backup"
+        assert not router.health["primary"].available()
+        assert router.candidates() == ["backup", "primary"]
+        # Primary would answer now, but it sits out its cooldown
+        assert await router.generate("hi") == "backup"
+
+    asyncio.run(run())
+    assert primary.calls == LLM_FAILURE_THRESHOLD
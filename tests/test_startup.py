@@ -0,0 +1,38 @@
+"""Cold start guard: importing main must stay cheap.
+
+Runs the benchmark's startup probe (benchmarks/run.py) in a fresh interpreter,
+as a cold-started instance would, and fails if a heavy SDK gets imported at
+module level or import time / peak RSS grow past their budgets.
+"""
+import os
+import sys
+import json
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.run import HEAVY_MODULES, STARTUP_PROBE
+
+# Budgets with headroom over a typical run (about 0.5s and 75MB)
+MAX_IMPORT_SECONDS = float(os.getenv("STARTUP_MAX_IMPORT_SECONDS", "3.0"))
+MAX_RSS_MB = float(os.getenv("STARTUP_MAX_RSS_MB", "150"))
+
+
+def probe_startup(workdir) -> dict:
+    env = dict(os.environ, SUPABASE_URL="http://localhost:54321", SUPABASE_KEY="test")
+    # A scratch directory, so nothing created at import lands in the checkout
+    output = subprocess.run([sys.executable, "-c", STARTUP_PROBE], capture_output=True, text=True,
+                            check=True, cwd=workdir, env=env)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def test_main_import_loads_no_heavy_modules(tmp_path):
+    sample = probe_startup(tmp_path)
+    assert sample["heavy_modules"] == [], f"imported at startup: {sample['heavy_modules']} (expected none of {HEAVY_MODULES})"
+
+
+def test_main_import_stays_within_budget(tmp_path):
+    sample = probe_startup(tmp_path)
+    assert sample["import_seconds"] < MAX_IMPORT_SECONDS
+    assert sample["max_rss_mb"] < MAX_RSS_MB
@@ -1,15 +1,35 @@
 import asyncio
+import json
+import re
 import sys
+import time
 import argparse
 import logging
 import requests
-from typing import List, Optional
-from telethon import TelegramClient, errors, events
-from telethon.tl.types import User
+import contextlib
+from typing import List, Optional, Union
+from telethon import TelegramClient, errors, utils
+from telethon.tl.types import InputPeerUser, User
 from config import TelegramConfig
+from account_pool import get_account_pool
+from tg_dispatcher import MessageDispatcher
+from rate_limiter import TokenBucket, get_rate_limiter
+from peer_cache import PeerCache, get_peer_cache
+from reply_classifier import CLOSING_MESSAGES, classify_reply
+from conversation_context import CONVERSATION_WINDOW_TURNS, ConversationContext, format_turn
+from conversation_store import (
+    ACTIVE_STATES, AGREED, AWAITING_REPLY, DISAGREED, FAILED, PENDING, TIMED_OUT,
+    ConversationStore, get_conversation_store,
+)
+from campaign_events import REPLIED, SENT, get_event_bus
+from event_recorder import EventRecorder, get_event_recorder
 from dotenv import load_dotenv
 import os 
-import google.generativeai as genai
+from llm_router import get_llm_router
+from metrics import (
+    ACTIVE_CONVERSATIONS, FLOOD_WAIT_SECONDS, PEER_CACHE_LOOKUPS, PEER_FLOODS, TELEGRAM_LATENCY,
+    span, trace_conversation,
+)
 
 # --- Setup API keys ---
 load_dotenv()
@@ -27,28 +47,165 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Longest FloodWait we sit out and retry; anything longer drops the send
+TG_MAX_FLOOD_WAIT_SECONDS = int(os.getenv("TG_MAX_FLOOD_WAIT_SECONDS", "3600"))
+# How long to pause the account after a PeerFloodError
+TG_PEER_FLOOD_COOLDOWN_SECONDS = int(os.getenv("TG_PEER_FLOOD_COOLDOWN_SECONDS", "1800"))
+
+# How long to wait for the target to answer before closing the conversation
+REPLY_TIMEOUT_SECONDS = int(os.getenv("REPLY_TIMEOUT_SECONDS", "300"))
+
+# Conversation state reached for each final LLM/classifier verdict
+FINAL_STATES = {"AGREED": AGREED, "DISAGREED": DISAGREED}
+
+INTRO_FALLBACK = "Hi! I'd love to introduce you to a new product."
+
+
+def format_history(history) -> str:
+    """Render chat history (a ConversationContext or a list of turns) for a prompt."""
+    if isinstance(history, ConversationContext):
+        return history.render()
+    return "\n".join([format_turn(msg) for msg in history]) if history else ""
+
+
+def build_intro_prompt(product_summary, target_description):
+    return f"You are an outreach agent. Write a friendly, concise intro message to a Telegram user describing the following product: {product_summary}. The target person is: {target_description}. Your goal is to get them interested in chatting with the founder about using the product."
+
+
+async def generate_intro(product_summary, target_description, providers: Optional[List[str]] = None):
+    """Generate a single intro message, falling back to a canned one on errors."""
+    try:
+        return await get_llm_router().generate(build_intro_prompt(product_summary, target_description), providers=providers, kind="intro")
+    except Exception as e:
+        print(f"LLM error: {e}")
+        return INTRO_FALLBACK
+
+
+def parse_batch_intros(text: str, count: int) -> dict:
+    """
+    Parse the JSON array returned for a batched intro prompt.
+    
+    Args:
+        text: Raw model output, possibly wrapped in a ```json fence
+        count: Number of targets that were sent
+    
+    Returns:
+        Dict mapping target number (1-based) to its intro; unparseable or
+        missing entries are left out
+    """
+    match = re.search(r"\[.*\]", text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        items = json.loads(match.group(0))
+    except ValueError:
+        return {}
+    intros = {}
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        try:
+            number = int(item.get("target"))
+        except (TypeError, ValueError):
+            continue
+        message = str(item.get("message") or "").strip()
+        if 1 <= number <= count and message:
+            intros[number] = message
+    return intros
+
+
+async def generate_intros_batch(product_summary, target_descriptions: List[str]) -> List[str]:
+    """
+    Generate intros for several targets with one LLM call.
+    
+    The product summary is sent once together with the numbered target
+    descriptions, and the model answers with a JSON array. Targets the
+    response doesn't cover are generated one by one.
+    
+    Args:
+        product_summary: The campaign summary
+        target_descriptions: One description per target
+    
+    Returns:
+        One intro per target, in the same order
+    """
+    if not target_descriptions:
+        return []
+    targets_str = "\n".join(f"{i}. {desc}" for i, desc in enumerate(target_descriptions, 1))
+    prompt = (
+        f"You are an outreach agent. Write a friendly, concise intro message to each of the Telegram users below, describing the following product: {product_summary}. "
+        f"Your goal is to get each of them interested in chatting with the founder about using the product.\n"
+        f"Target people:\n{targets_str}\n"
+        f'Reply only with a JSON array of objects of the form {{"target": <number>, "message": "<intro>"}}, one per target.'
+    )
+    intros = {}
+    try:
+        text = await get_llm_router().generate(prompt, kind="intro_batch")
+        intros = parse_batch_intros(text, len(target_descriptions))
+    except Exception as e:
+        print(f"LLM error (batch intro): {e}")
+
+    missing = [i for i in range(1, len(target_descriptions) + 1) if i not in intros]
+    if missing:
+        logger.warning(f"Batched intro generation missed {len(missing)} of {len(target_descriptions)} targets, generating them individually")
+        singles = await asyncio.gather(*(generate_intro(product_summary, target_descriptions[i - 1]) for i in missing))
+        intros.update(zip(missing, singles))
+    return [intros[i] for i in range(1, len(target_descriptions) + 1)]
+
 class TelegramSender:
     """Main class for sending Telegram messages using the Client API."""
     
-    def __init__(self):
-        """Initialize the Telegram sender with configuration."""
+    def __init__(self, client: Optional[TelegramClient] = None, dispatcher: Optional[MessageDispatcher] = None,
+                 rate_limiter: Optional[TokenBucket] = None, peer_cache: Optional[PeerCache] = None,
+                 store: Optional[ConversationStore] = None, config: Optional[TelegramConfig] = None,
+                 recorder: Optional[EventRecorder] = None):
+        """
+        Initialize the Telegram sender with configuration.
+        
+        Args:
+            client: An already connected client to reuse (e.g. the shared one
+                from TelegramClientManager). When omitted the sender creates
+                and owns its own client.
+            dispatcher: The dispatcher registered on that client. When omitted
+                the sender creates one and attaches it on connect.
+            rate_limiter: Token bucket for the account. Defaults to the shared
+                bucket for this session.
+            peer_cache: Username cache for the account. Defaults to the
+                persistent cache for this session.
+            store: Where conversation state and turns are persisted.
+                Defaults to the process-wide conversation store.
+            config: Credentials of the account to send from. Defaults to
+                the single account configured by API_ID/API_HASH/PHONE_NUMBER.
+            recorder: Where sends, replies and outcomes are logged. Defaults
+                to the process-wide event recorder.
+        """
         try:
-            self.config = TelegramConfig()
-            self.client = TelegramClient(
+            self.config = config if config is not None else TelegramConfig()
+            self.owns_client = client is None
+            self.client = client or TelegramClient(
                 self.config.get_session_name(),
                 self.config.get_api_id(),
                 self.config.get_api_hash()
             )
-            self.GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-            genai.configure(api_key=self.GEMINI_API_KEY)
+            self.dispatcher = dispatcher if dispatcher is not None else MessageDispatcher()
+            self.rate_limiter = rate_limiter if rate_limiter is not None else get_rate_limiter(self.config.get_session_name())
+            self.peer_cache = peer_cache if peer_cache is not None else get_peer_cache(self.config.get_session_name())
+            self.store = store if store is not None else get_conversation_store()
+            self.events = get_event_bus()
+            self.recorder = recorder if recorder is not None else get_event_recorder()
+            # All LLM calls go through the shared provider router
+            self.llm = get_llm_router()
         except Exception as e:
             logger.error(f"Failed to initialize TelegramSender: {e}")
             raise
     
     async def connect(self):
         """Connect to Telegram and authenticate if necessary."""
+        if not self.owns_client:
+            return
         try:
             await self.client.start(phone=self.config.get_phone_number())
+            self.dispatcher.attach(self.client)
             logger.info("Successfully connected to Telegram")
             
             # Get information about the authenticated user
@@ -61,38 +218,105 @@ class TelegramSender:
     
     async def disconnect(self):
         """Disconnect from Telegram."""
+        if not self.owns_client:
+            return
         await self.client.disconnect()
         logger.info("Disconnected from Telegram")
     
-    async def resolve_username(self, username: str) -> Optional[User]:
+    async def resolve_username(self, username: str) -> Optional[Union[User, InputPeerUser]]:
         """
         Resolve a username to a Telegram user.
         
+        Known usernames are answered from the persistent peer cache without a
+        network call, including ones that previously failed to resolve. A
+        FloodWait pauses the account's rate limiter and the lookup is retried
+        once it has passed.
+        
         Args:
             username: The username to resolve (with or without @)
         
         Returns:
-            User object if found, None otherwise
+            User (or cached InputPeerUser) if found, None otherwise
+        
+        Raises:
+            errors.FloodWaitError: The wait is longer than TG_MAX_FLOOD_WAIT_SECONDS
         """
         # Remove @ if present
         clean_username = username.lstrip('@')
         
-        try:
-            entity = await self.client.get_entity(clean_username)
-            if isinstance(entity, User):
-                return entity
-            else:
-                logger.warning(f"@{clean_username} is not a user (might be a channel or group)")
+        cached = self.peer_cache.get(clean_username)
+        PEER_CACHE_LOOKUPS.labels(result="miss" if cached is None else "hit").inc()
+        if cached is not None:
+            if not cached.found:
+                return None
+            return InputPeerUser(cached.user_id, cached.access_hash)
+
+        while True:
+            try:
+                return await self._resolve_remote(clean_username)
+            except errors.FloodWaitError as e:
+                FLOOD_WAIT_SECONDS.labels(method="get_entity").observe(e.seconds)
+                # Lookups count against the same account limits as sends
+                self.rate_limiter.penalize(e.seconds)
+                if e.seconds > TG_MAX_FLOOD_WAIT_SECONDS:
+                    logger.error(f"Rate limited for {e.seconds} seconds resolving @{clean_username}")
+                    raise
+                logger.warning(f"Rate limited resolving @{clean_username}. Retrying after {e.seconds} seconds")
+                await self.rate_limiter.wait_unblocked()
+            except Exception as e:
+                logger.error(f"Error resolving username @{clean_username}: {e}")
                 return None
+
+    async def _resolve_remote(self, clean_username: str) -> Optional[User]:
+        """Resolve a username over the network and record the result in the peer cache."""
+        try:
+            with TELEGRAM_LATENCY.labels(method="get_entity").time(), span("telegram.get_entity"):
+                entity = await self.client.get_entity(clean_username)
         except errors.UsernameNotOccupiedError:
             logger.error(f"Username @{clean_username} not found")
+            self.peer_cache.put_negative(clean_username)
             return None
         except errors.UsernameInvalidError:
             logger.error(f"Username @{clean_username} is invalid")
+            self.peer_cache.put_negative(clean_username)
             return None
-        except Exception as e:
-            logger.error(f"Error resolving username @{clean_username}: {e}")
+        if isinstance(entity, User):
+            self.peer_cache.put(clean_username, entity.id, entity.access_hash)
+            return entity
+        else:
+            logger.warning(f"@{clean_username} is not a user (might be a channel or group)")
+            self.peer_cache.put_negative(clean_username)
             return None
+
+    async def warm_peer_cache(self, usernames: List[str]) -> int:
+        """
+        Resolve every username not already in the peer cache.
+        
+        Stops early on a FloodWait, leaving the rest to be resolved on demand.
+        
+        Args:
+            usernames: Usernames to resolve (with or without @)
+        
+        Returns:
+            Number of usernames looked up over the network
+        """
+        pending = list(dict.fromkeys(
+            u.lstrip('@') for u in usernames if u and self.peer_cache.get(u) is None
+        ))
+        resolved = 0
+        for clean_username in pending:
+            try:
+                await self._resolve_remote(clean_username)
+                resolved += 1
+            except errors.FloodWaitError as e:
+                FLOOD_WAIT_SECONDS.labels(method="get_entity").observe(e.seconds)
+                self.rate_limiter.penalize(e.seconds)
+                logger.warning(f"Rate limited while warming peer cache ({e.seconds}s), {len(pending) - resolved} usernames left unresolved")
+                break
+            except Exception as e:
+                logger.error(f"Error resolving username @{clean_username}: {e}")
+        logger.info(f"Peer cache warmed: {resolved} of {len(pending)} uncached usernames resolved")
+        return resolved
     
     async def send_message(self, username: str, message: str) -> bool:
         """
@@ -104,46 +328,54 @@ class TelegramSender:
         
         Returns:
             True if successful, False otherwise
+        
+        Raises:
+            errors.FloodWaitError: The account is rate limited for longer than
+                TG_MAX_FLOOD_WAIT_SECONDS; the send should be retried later
         """
         user = await self.resolve_username(username)
         if not user:
             return False
         
-        try:
-            await self.client.send_message(user, message)
-            logger.info(f"Message sent successfully to @{username}")
-            return True
-        except errors.FloodWaitError as e:
-            logger.error(f"Rate limited. Need to wait {e.seconds} seconds")
-            return False
-        except errors.PeerFloodError:
-            logger.error("Too many requests. Please try again later")
-            return False
-        except Exception as e:
-            logger.error(f"Failed to send message to @{username}: {e}")
-            return False
+        # A FloodWait puts the send back behind the account's token bucket
+        # instead of dropping it
+        while True:
+            with span("telegram.rate_limit_wait"):
+                await self.rate_limiter.acquire()
+            try:
+                with TELEGRAM_LATENCY.labels(method="send_message").time(), span("telegram.send_message"):
+                    await self.client.send_message(user, message)
+                logger.info(f"Message sent successfully to @{username}")
+                return True
+            except errors.FloodWaitError as e:
+                FLOOD_WAIT_SECONDS.labels(method="send_message").observe(e.seconds)
+                if e.seconds > TG_MAX_FLOOD_WAIT_SECONDS:
+                    logger.error(f"Rate limited for {e.seconds} seconds, postponing the message to @{username.lstrip('@')}")
+                    self.rate_limiter.penalize(e.seconds)
+                    raise
+                logger.warning(f"Rate limited. Requeueing message to @{username} after {e.seconds} seconds")
+                self.rate_limiter.penalize(e.seconds)
+            except errors.PeerFloodError:
+                PEER_FLOODS.inc()
+                logger.error("Too many requests. Please try again later")
+                self.rate_limiter.penalize(TG_PEER_FLOOD_COOLDOWN_SECONDS)
+                return False
+            except errors.PeerIdInvalidError:
+                # The cached access_hash is no longer valid; resolve afresh next time
+                logger.error(f"Failed to send message to @{username}: stale peer")
+                self.peer_cache.invalidate(username)
+                return False
+            except Exception as e:
+                logger.error(f"Failed to send message to @{username}: {e}")
+                return False
 
-    # Placeholder for OpenAI support
-    def generate_intro_openai(self, product_summary, target_description):
-        # Implement OpenAI API call here in future
-        return "Hi! I'd love to introduce you to a new product."
-        
-    # Generate initial message using Gemini
-    def generate_intro_gemini(self, product_summary, target_description):
-        # Replace with your Gemini API key
+    # Generate initial message using OpenAI only
+    async def generate_intro_openai(self, product_summary, target_description):
+        return await generate_intro(product_summary, target_description, providers=["openai"])
         
-        # url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent?key={GEMINI_API_KEY}"
-        prompt = f"You are an outreach agent. Write a friendly, concise intro message to a Telegram user describing the following product: {product_summary}. The target person is: {target_description}. Your goal is to get them interested in chatting with the founder about using the product."
-        
-        # payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        try:
-            model = genai.GenerativeModel("gemini-1.5-flash")
-            response = model.generate_content(prompt)
-            final_context = response.text.strip()
-            return final_context
-        except Exception as e:
-            print(f"Gemini API error: {e}")
-            return "Hi! I'd love to introduce you to a new product."
+    # Generate initial message using Gemini only
+    async def generate_intro_gemini(self, product_summary, target_description):
+        return await generate_intro(product_summary, target_description, providers=["gemini"])
 
     # Use Gemini to generate a response to the user's reply
     # def generate_reply_gemini(self, product_summary, target_description, user_reply):
@@ -153,179 +385,313 @@ class TelegramSender:
     #         response = model.generate_content(prompt)
     #         return response.text.strip()
     #     except Exception as e:
-    #         print(f"Gemini API error: {e}")
+    #         print(f"LLM error: {e}")
     #         return "Thanks for your reply! Would you be open to a quick chat with the founder?"
 
-    # # Use Gemini to generate next reply, with chat history
-    def generate_reply_gemini(self, product_summary, target_description, user_reply, history=None):
-        history_str = "\n".join([f"{msg['role']}: {msg['text']}" for msg in history]) if history else ""
+    # # Generate next reply, with chat history
+    async def generate_reply_gemini(self, product_summary, target_description, user_reply, history=None):
+        history_str = format_history(history)
         prompt = f"You are an outreach agent. You introduced the product: {product_summary} to a person described as: {target_description}.\nConversation history:\n{history_str}\nThey replied: '{user_reply}'. Your goal is to keep the conversation going and close it if the person agrees or disagrees to meet the founder for a quick chat about the product. If they agree, thank them and end the conversation. If they disagree, politely thank them and end the conversation."
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(prompt)
-            return response.text.strip()
+            return await self.llm.generate(prompt, kind="reply")
         except Exception as e:
-            print(f"Gemini API error: {e}")
+            print(f"LLM error: {e}")
             return "Thanks for your reply! Would you be open to a quick chat with the founder?"
 
-    # Let Gemini decide if the conversation should close
-    def check_conversation_status_gemini(self, product_summary, target_description, history):
-        history_str = "\n".join([f"{msg['role']}: {msg['text']}" for msg in history]) if history else ""
+    # Let the LLM decide if the conversation should close
+    async def check_conversation_status_gemini(self, product_summary, target_description, history):
+        history_str = format_history(history)
         prompt = f"You are an outreach agent. Here is the conversation history with a Telegram user about the product: {product_summary}. The target person is: {target_description}.\nConversation history:\n{history_str}\nHas the user agreed to meet the founder for a quick chat about the product? Reply with 'AGREED', 'DISAGREED', or 'CONTINUE'."
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            response = model.generate_content(prompt)
-            status = response.text.strip().upper()
+            status = (await self.llm.generate(prompt, kind="status")).upper()
             return status
         except Exception as e:
-            print(f"Gemini API error (status check): {e}")
+            print(f"LLM error (status check): {e}")
             return "CONTINUE"
+
+    # Fold older turns into the rolling conversation summary
+    async def summarize_turns(self, previous_summary, turns):
+        turns_str = "\n".join(format_turn(turn) for turn in turns)
+        prompt = f"You are summarizing an outreach conversation on Telegram. Summary so far:\n{previous_summary or '(none)'}\nNew messages:\n{turns_str}\nWrite an updated summary in a few sentences, keeping the person's interests, objections and anything they asked for."
+        return await self.llm.generate(prompt, kind="summary")
+
+    # One LLM call returning both the next message and the conversation verdict
+    async def generate_reply_with_status(self, product_summary, target_description, user_reply, history=None):
+        """
+        Generate the next message and decide the conversation status in one call.
+        
+        Falls back to the separate reply and status calls if the response
+        can't be parsed.
+        
+        Returns:
+            Tuple of (message, status) where status is 'AGREED', 'DISAGREED' or 'CONTINUE'
+        """
+        history_str = format_history(history)
+        prompt = (
+            f"You are an outreach agent. You introduced the product: {product_summary} to a person described as: {target_description}.\n"
+            f"Conversation history:\n{history_str}\nThey replied: '{user_reply}'. "
+            "Your goal is to keep the conversation going and close it if the person agrees or disagrees to meet the founder for a quick chat about the product. "
+            "If they agree, thank them and end the conversation. If they disagree, politely thank them and end the conversation.\n"
+            'Reply only with a JSON object of the form {"message": "<your next message>", "status": "<AGREED|DISAGREED|CONTINUE>"}, '
+            "where status says whether the user has agreed to meet the founder."
+        )
+        try:
+            text = await self.llm.generate(prompt, kind="reply_status")
+            match = re.search(r"\{.*\}", text, re.DOTALL)
+            result = json.loads(match.group(0)) if match else {}
+            message = str(result.get("message") or "").strip()
+            status = str(result.get("status") or "").strip().upper()
+            if message and status in ("AGREED", "DISAGREED", "CONTINUE"):
+                return message, status
+            logger.warning("Unparseable combined reply/status response, falling back to separate calls")
+        except Exception as e:
+            print(f"LLM error (combined reply): {e}")
+
+        message = await self.generate_reply_gemini(product_summary, target_description, user_reply, history)
+        status = await self.check_conversation_status_gemini(product_summary, target_description, history)
+        return message, status
+
+    async def respond_to_reply(self, product_summary, target_description, user_reply, history=None):
+        """
+        Decide how to answer the target's reply.
+        
+        Obvious yes/no answers are settled by the local classifier with a
+        canned closing message; everything else takes one combined LLM call.
+        
+        Returns:
+            Tuple of (message, status)
+        """
+        status = classify_reply(user_reply)
+        if status:
+            logger.info(f"Reply classified locally as {status}")
+            return CLOSING_MESSAGES[status], status
+        return await self.generate_reply_with_status(product_summary, target_description, user_reply, history)
+                     
+    async def wait_for_reply(self, queue: asyncio.Queue, timeout: float = REPLY_TIMEOUT_SECONDS):
+        """
+        Wait for the next private message routed to this conversation's queue.
+        
+        Args:
+            queue: The queue returned by MessageDispatcher.register
+            timeout: Seconds to wait before giving up
+        
+        Returns:
+            Tuple of (sender name, message text, message id)
+        
+        Raises:
+            asyncio.TimeoutError: if nothing arrives within the timeout
+        """
+        event = await asyncio.wait_for(queue.get(), timeout=timeout)
+        sender = await event.get_sender()
+        sender_name = sender.username or sender.first_name or 'Unknown'
+        return sender_name, event.text, event.id
+
+    async def _catch_up(self, target, conversation, queue: asyncio.Queue):
+        """Queue replies that arrived while this conversation wasn't running (e.g. during a restart)."""
+        last_incoming_id = conversation.get("last_incoming_id") or 0
+        missed = []
+        async for message in self.client.iter_messages(target, limit=20):
+            if message.out or message.id <= last_incoming_id:
+                break
+            missed.append(message)
+        for message in reversed(missed):
+            queue.put_nowait(message)
+        if missed:
+            logger.info(f"Conversation {conversation['id']}: picked up {len(missed)} missed replies")
                      
-    async def interactive_mode(self, product_summary, target_description, username):
-        """Interactive mode for sending messages."""
-        print("\n=== Telegram Message Sender - Interactive Mode ===")
-        print("Type 'quit' or 'exit' to stop")
+    def _report_status(self, status) -> bool:
+        """Print the outcome for a final status; returns True if the conversation is over."""
+        if status == "AGREED":
+            print("\n🎉 Target person agreed to meet the founder! Conversation closed.")
+            return True
+        elif status == "DISAGREED":
+            print("\n❌ Target person declined to meet the founder. Conversation closed.")
+            return True
+        return False
 
+    async def run_conversation(self, conversation: dict, slot=None) -> str:
+        """
+        Drive a conversation from its stored state until it reaches a final state.
+        
+        Every transition and turn is written to the conversation store, so a
+        conversation interrupted by a restart is resumed from where it stopped,
+        including the remaining reply timeout and any replies that arrived
+        while it was down.
+        
+        Args:
+            conversation: Conversation record from the store
+            slot: The scheduler's ConversationSlot held by this conversation,
+                given up while it waits for a reply
+        
+        Returns:
+            The final state
+        """
+        ACTIVE_CONVERSATIONS.inc()
         try:
-            # Collect product and target info
-            # product_summary = input("Enter a summary of your product: ").strip()
-            # target_description = input("Enter a description of the target person: ").strip()
-            # username = input("Enter username of the target person (with or without @): ").strip()
-            if username.lower() in ['quit', 'exit']:
-                return
-            if not username:
-                print("Please enter a valid username")
-                return
-
-            # Choose AI provider (default Gemini, option for OpenAI in future)
-            ai_provider = 'gemini'  # Change to 'openai' for OpenAI support
-
-            if ai_provider == 'gemini':
-                initial_message = self.generate_intro_gemini(product_summary, target_description)
-            else:
-                initial_message = self.generate_intro_openai(product_summary, target_description)
-
-            print(f"\nGenerated intro message:\n{initial_message}\n")
-            print(f"Sending message to @{username.lstrip('@')}...")
-            success = await self.send_message(username, initial_message)
-            if success:
-                print("✅ Message sent successfully!")
-            else:
+            with trace_conversation(conversation["id"]):
+                return await self._run_conversation(conversation, slot)
+        finally:
+            ACTIVE_CONVERSATIONS.dec()
+
+    async def _run_conversation(self, conversation: dict, slot=None) -> str:
+        conversation_id = conversation["id"]
+        username = conversation["username"]
+        product_summary = conversation["product_summary"]
+        target_description = conversation["target_description"]
+        state = conversation["state"]
+        deadline = conversation.get("reply_deadline")
+        peer_id = None
+
+        def publish(status):
+            self.events.publish(conversation.get("campaign_id"), conversation_id, conversation.get("lead_id"), username, status)
+            self.recorder.record(conversation.get("campaign_id"), conversation_id, conversation.get("lead_id"), username,
+                                 status, account=self.config.get_session_name())
+
+        def transition(new_state, **fields):
+            nonlocal state
+            state = new_state
+            self.store.update(conversation_id, state=new_state, **fields)
+            # Keep the record current for a scheduler that requeues it
+            conversation.update(fields, state=new_state)
+            if new_state not in ACTIVE_STATES:
+                publish(new_state)
+
+        try:
+            # Route this user's replies to our own queue before anything goes out,
+            # so a quick answer can't slip past us
+            target = await self.resolve_username(username)
+            if not target:
                 print("❌ Failed to send message")
-                return
+                transition(FAILED)
+                return state
+            peer_id = utils.get_peer_id(target)
+            replies = self.dispatcher.register(peer_id)
 
-            print(f"Waiting for a reply from @{username.lstrip('@')}...")
-            event_future = asyncio.get_event_loop().create_future()
+            # Recent turns verbatim plus a rolling summary, so prompts stay within budget
+            chat_history = ConversationContext(
+                summarizer=self.summarize_turns,
+                summary=conversation.get("summary") or "",
+                turns=await self.store.recent_turns(conversation_id, CONVERSATION_WINDOW_TURNS),
+            )
+            if state == AWAITING_REPLY:
+                await self._catch_up(target, conversation, replies)
 
-            @self.client.on(events.NewMessage(from_users=username.lstrip('@'), incoming=True))
-            async def reply_handler(event):
-                if not event.is_private:
-                    return
-                if not event_future.done():
-                    event_future.set_result(event)
+            async def record_turn(role, name, text):
+                await chat_history.add(role, name, text)
+                self.store.append_turn(conversation_id, role, name, text)
 
-            try:
-                event = await asyncio.wait_for(event_future, timeout=300)  # 5 min timeout
-                sender = await event.get_sender()
-                sender_name = sender.username or sender.first_name or 'Unknown'
-                user_reply = event.text
-                print(f"\n📩 Reply from @{sender_name}: {user_reply}")
-
-                ai_provider = 'gemini'
-                if ai_provider == 'gemini':
-                    followup_message = self.generate_reply_gemini(product_summary, target_description, user_reply)
-                else:
-                    followup_message = "Thanks for your reply! Would you be open to a quick chat with the founder?"
-
-                print(f"\nGenerated follow-up message:\n{followup_message}\n")
-                print(f"Sending follow-up message to @{username.lstrip('@')}...")
-                success = await self.send_message(username, followup_message)
-                if success:
-                    print("✅ Follow-up message sent successfully!")
-                else:
-                    print("❌ Failed to send follow-up message")
-            except asyncio.TimeoutError:
-                print("No reply received within 5 minutes.")
-            finally:
-                self.client.remove_event_handler(reply_handler)
-
-            # Automated chat loop using Gemini
-            print(f"\nAutomated chat with @{username.lstrip('@')} using Gemini. Conversation will end if the target agrees to meet the founder.")
-            chat_history = []
-            last_user_reply = None
-            while True:
-                print(f"Waiting for a reply from @{username.lstrip('@')}...")
-                event_future = asyncio.get_event_loop().create_future()
+            while state in ACTIVE_STATES:
+                if state == PENDING:
+                    # The campaign scheduler may already have generated the intro in a batch;
+                    # otherwise the router picks the provider
+                    initial_message = conversation.get("intro")
+                    if not initial_message:
+                        initial_message = await generate_intro(product_summary, target_description)
 
-                @self.client.on(events.NewMessage(from_users=username.lstrip('@'), incoming=True))
-                async def reply_handler(event):
-                    if not event.is_private:
-                        return
-                    if not event_future.done():
-                        event_future.set_result(event)
+                    print(f"\nGenerated intro message:\n{initial_message}\n")
+                    print(f"Sending message to @{username.lstrip('@')}...")
+                    if not await self.send_message(username, initial_message):
+                        print("❌ Failed to send message")
+                        transition(FAILED)
+                        break
+                    print("✅ Message sent successfully!")
+                    publish(SENT)
+                    await record_turn("agent", "Gemini", initial_message)
+                    deadline = time.time() + REPLY_TIMEOUT_SECONDS
+                    transition(AWAITING_REPLY, intro=initial_message, reply_deadline=deadline)
+                    continue
 
+                # AWAITING_REPLY
+                print(f"Waiting for a reply from @{username.lstrip('@')}...")
+                remaining = (deadline or time.time() + REPLY_TIMEOUT_SECONDS) - time.time()
+                # A parked conversation doesn't count against the scheduler's concurrency
+                parked = slot.parked() if slot is not None else contextlib.nullcontext()
                 try:
-                    event = await asyncio.wait_for(event_future, timeout=300)  # 5 min timeout
-                    sender = await event.get_sender()
-                    sender_name = sender.username or sender.first_name or 'Unknown'
-                    last_user_reply = event.text
-                    print(f"\n📩 Reply from @{sender_name}: {last_user_reply}")
-                    chat_history.append({"role": "user", "name": sender_name, "text": last_user_reply})
+                    with span("conversation.wait_for_reply"):
+                        async with parked:
+                            sender_name, last_user_reply, message_id = await self.wait_for_reply(replies, max(0, remaining))
                 except asyncio.TimeoutError:
-                    print("No reply received within 5 minutes. Ending conversation.")
-                    self.client.remove_event_handler(reply_handler)
+                    print(f"No reply received within {REPLY_TIMEOUT_SECONDS // 60} minutes. Ending conversation.")
+                    transition(TIMED_OUT)
                     break
-                finally:
-                    self.client.remove_event_handler(reply_handler)
+                print(f"\n📩 Reply from @{sender_name}: {last_user_reply}")
+                publish(REPLIED)
+                await record_turn("user", sender_name, last_user_reply)
 
-                ai_provider = 'gemini'
-                followup_message = self.generate_reply_gemini(product_summary, target_description, last_user_reply, chat_history)
+                # Reply and verdict come from one call (or none, for obvious answers)
+                followup_message, status = await self.respond_to_reply(product_summary, target_description, last_user_reply, chat_history)
                 print(f"\nGenerated message:\n{followup_message}\n")
-                chat_history.append({"role": "agent", "name": "Gemini", "text": followup_message})
                 print(f"Sending message to @{username.lstrip('@')}...")
-                success = await self.send_message(username, followup_message)
-                if success:
-                    print("✅ Message sent successfully!")
-                else:
+                if not await self.send_message(username, followup_message):
                     print("❌ Failed to send message")
+                    transition(FAILED, last_incoming_id=message_id)
                     break
+                print("✅ Message sent successfully!")
+                await record_turn("agent", "Gemini", followup_message)
 
-                status = self.check_conversation_status_gemini(product_summary, target_description, chat_history)
-                if status == "AGREED":
-                    print("\n🎉 Target person agreed to meet the founder! Conversation closed.")
-                    break
-                elif status == "DISAGREED":
-                    print("\n❌ Target person declined to meet the founder. Conversation closed.")
-                    break
+                self._report_status(status)
+                deadline = time.time() + REPLY_TIMEOUT_SECONDS
+                transition(
+                    FINAL_STATES.get(status, AWAITING_REPLY),
+                    last_incoming_id=message_id,
+                    reply_deadline=deadline,
+                    summary=chat_history.summary,
+                )
+        except errors.FloodWaitError:
+            # Not the target's fault: the conversation stays active and its
+            # scheduler requeues it once the account may send again
+            logger.warning(f"Conversation {conversation_id} with @{username.lstrip('@')} postponed by a FloodWait")
         except KeyboardInterrupt:
             print("\nExiting...")
         except Exception as e:
             print(f"Error: {e}")
+        finally:
+            if peer_id is not None:
+                self.dispatcher.unregister(peer_id)
+        return state
 
 
-async def main(product_summary, target_description, tg_id):
-    """Main function to handle command line arguments and run the appropriate mode."""    
-    # Initialize sender
+async def run_conversation(conversation: dict, slot=None):
+    """Run (or resume) a stored conversation on the account it is assigned to."""
+    pool = get_account_pool()
+    account = pool.assign(conversation, get_conversation_store())
     try:
-        sender = TelegramSender()
-        await sender.connect()
+        sender = await shared_sender(account.name)
     except Exception as e:
         logger.error(f"Failed to initialize: {e}")
-        return 1
-    
+        pool.release(conversation)
+        return None
     try:
-        # Interactive mode
-        await sender.interactive_mode(product_summary, target_description, tg_id)
-    
+        return await sender.run_conversation(conversation, slot)
     finally:
-        await sender.disconnect()
-    
-    return 0
+        pool.release(conversation)
+
+async def shared_sender(account: Optional[str] = None) -> "TelegramSender":
+    """Build a sender on an account's shared, long-lived client (the pool's choice when not given)."""
+    pool = get_account_pool()
+    selected = pool.get(account) or pool.choose()
+    client = await selected.manager.get_client()
+    return TelegramSender(
+        client=client, dispatcher=selected.manager.dispatcher, rate_limiter=selected.rate_limiter,
+        peer_cache=selected.peer_cache, config=selected.config or selected.manager.config,
+    )
+
+async def warm_peer_cache(usernames, account: Optional[str] = None):
+    """Resolve a campaign's usernames up front on the account that will message them."""
+    sender = await shared_sender(account)
+    return await sender.warm_peer_cache(usernames)
 
 def run_telegram_agent(product_summary, target_description, tg_id):
+    """Start outreach to one target through the campaign scheduler; returns the campaign id.
+
+    The conversation is stored and driven like any campaign lead, inside this
+    process or by the outreach workers when OUTREACH_MODE=queue.
+    """
+    # Imported here: the scheduler itself imports this module
+    from campaign_scheduler import get_campaign_scheduler
     try:
-        # Schedule the async main function in the current event loop (fire and forget)
-        loop = asyncio.get_event_loop()
-        loop.create_task(main(product_summary, target_description, tg_id))
+        return get_campaign_scheduler().submit(
+            product_summary, [{"tg_id": tg_id, "person_description": target_description}]
+        )
     except Exception as e:
         logger.error(f"Unexpected error: {e}")
\ No newline at end of file
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Optional
+from telethon import TelegramClient
+from config import TelegramConfig
+from tg_dispatcher import MessageDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramClientManager:
+    """Owns a single long-lived TelegramClient shared by every conversation.
+
+    The client is connected once (normally at app startup) and handed out to
+    each TelegramSender, so targets no longer pay a connect/disconnect round
+    trip and never compete for the same session file.
+    """
+
+    def __init__(self, config: Optional[TelegramConfig] = None, client_factory=TelegramClient):
+        self.config = config
+        self.client_factory = client_factory
+        self.client: Optional[TelegramClient] = None
+        self.dispatcher = MessageDispatcher()
+        self._lock = asyncio.Lock()
+        self._started = False
+
+    async def start(self):
+        """Create the client and authenticate, if that hasn't happened yet."""
+        async with self._lock:
+            if self._started:
+                return
+            if self.config is None:
+                self.config = TelegramConfig()
+            if self.client is None:
+                self.client = self.client_factory(
+                    self.config.get_session_name(),
+                    self.config.get_api_id(),
+                    self.config.get_api_hash()
+                )
+            await self.client.start(phone=self.config.get_phone_number())
+            self.dispatcher.attach(self.client)
+            me = await self.client.get_me()
+            logger.info(f"Shared Telegram client logged in as: {me.first_name} {me.last_name or ''} (@{me.username or 'no username'})")
+            self._started = True
+
+    async def get_client(self) -> TelegramClient:
+        """Return the shared client, starting or reconnecting it as needed."""
+        if not self._started:
+            await self.start()
+        if not self.client.is_connected():
+            async with self._lock:
+                if not self.client.is_connected():
+                    logger.warning("Shared Telegram client disconnected, reconnecting")
+                    await self.client.connect()
+        return self.client
+
+    async def stop(self):
+        """Disconnect the shared client."""
+        async with self._lock:
+            if self.client is not None and self.client.is_connected():
+                await self.client.disconnect()
+                logger.info("Shared Telegram client disconnected")
+            self._started = False
+
+
+_manager: Optional[TelegramClientManager] = None
+
+
+def get_client_manager() -> TelegramClientManager:
+    """Return the process-wide TelegramClientManager."""
+    global _manager
+    if _manager is None:
+        _manager = TelegramClientManager()
+    return _manager
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Dict
+from telethon import events
+
+logger = logging.getLogger(__name__)
+
+
+class MessageDispatcher:
+    """Routes incoming private messages to per-conversation queues.
+
+    A single NewMessage handler is registered on the client. Each update is
+    routed with one dict lookup on the sender id, so the cost per update does
+    not depend on how many conversations are live. Conversations with the
+    same peer (e.g. from two campaigns) share its queue, which is kept until
+    the last of them unregisters.
+    """
+
+    def __init__(self):
+        self._queues: Dict[int, asyncio.Queue] = {}
+        self._registrations: Dict[int, int] = {}
+        self._attached = set()
+
+    def attach(self, client):
+        """Register the dispatcher's handler on a client (once per client)."""
+        if id(client) in self._attached:
+            return
+        client.add_event_handler(self._on_message, events.NewMessage(incoming=True))
+        self._attached.add(id(client))
+
+    async def _on_message(self, event):
+        if not event.is_private:
+            return
+        queue = self._queues.get(event.sender_id)
+        if queue is not None:
+            queue.put_nowait(event)
+
+    def register(self, peer_id: int) -> asyncio.Queue:
+        """Start routing messages from peer_id and return their queue."""
+        queue = self._queues.get(peer_id)
+        if queue is None:
+            queue = self._queues[peer_id] = asyncio.Queue()
+        self._registrations[peer_id] = self._registrations.get(peer_id, 0) + 1
+        return queue
+
+    def unregister(self, peer_id: int):
+        """Drop one registration; messages from peer_id stop being routed after the last."""
+        remaining = self._registrations.get(peer_id, 0) - 1
+        if remaining > 0:
+            self._registrations[peer_id] = remaining
+            return
+        self._registrations.pop(peer_id, None)
+        self._queues.pop(peer_id, None)
+
+    def queued(self) -> int:
+        """Messages routed to queues but not yet consumed."""
+        return sum(queue.qsize() for queue in self._queues.values())
+
+    def __len__(self):
+        return len(self._queues)